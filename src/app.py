@@ -1,20 +1,55 @@
-from fastapi import FastAPI, Depends, APIRouter, HTTPException
-from sqlmodel import SQLModel, Session
+from fastapi import FastAPI, Depends, APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from sqlmodel.ext.asyncio.session import AsyncSession
 import firebase_admin
 from firebase_admin import credentials
 from pydantic import BaseModel
-import tensorflow as tf
 import numpy as np
 import joblib
-
-from core.db import db_engine
+import asyncio
+import os
+
+from core.cache import create_cache
+from core.catalog import Catalog
+from core.db import async_session, env_flag, get_session, pool_metrics
+from core.efficiency import EfficiencyTable
+from core.export import MEDIA_TYPES, stream_history
+from core.features import car_features
+from core.fuelprofile import fuel_profile, route_segments
+from core.inference import BatchedPredictor
+from core.model import load_model
+from core.pagination import decode_offset, encode_cursor, next_cursor, paginate
+from core.polyline import ENCODINGS, transcode
+from core.responses import UserResponseCache, UserVersions
+from core.search import CarSearch
+from core.startup import startup
+from core.models import CarOwnership, History, UserStats
+from core.stats import record_trips
+from core.telemetry import PrometheusText, TelemetryMiddleware, http_metrics
+from core.whatif import SORT_KEYS, car_mask, km_per_liter_matrix, rank_costs
 from feat.dummy.router import dummy_router
 from feat.auth.router import get_user_id
+from feat.auth.verifier import token_verifier
 
 from sqlmodel import Field, select
+from sqlalchemy.orm import joinedload
 from typing import Optional
 
-from get_polyline import get_routes, search_location
+from get_polyline import (
+    NO_ROUTE_STATUSES,
+    MapsError,
+    distance_estimator,
+    geocode_stats,
+    get_routes,
+    load_local_geocoder,
+    load_road_graph,
+    maps,
+    place_search,
+    reverse_geocode,
+    route_cache,
+    search_location,
+)
 
 
 class PredictionResponse(BaseModel):
@@ -23,130 +58,198 @@ class PredictionResponse(BaseModel):
     cost_total: float
 
 
-class CarOwnership(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: str
-    car_id: int = Field(foreign_key="car.id")
-    custom_name: str
-    fuel_grade: int
+MODEL_PATH = "model.h5"
+SCALER_PATH = "scaler.joblib"
+FIREBASE_CREDENTIALS_PATH = "core/keys/lut-fuel-firebase-adminsdk-aftnm-274f94905c.json"
 
-
-class History(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: str
-    car_id: int
-    fuel_id: int
-    car_custom_name: Optional[str] = None
-    fuel_needed: float
-    distance: float
-    # from_location: str = Field(alias="from")
-    from_location: str
-    destination: str
-    tolls: bool
-    fuel_cost: float
-    toll_cost: float
-
-
-class Car(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    maker: str
-    model: str
-    number_of_cylinders: int
-    engine_type: int
-    engine_horse_power: float
-    engine_horse_power_rpm: int
-    transmission: int
-    fuel_tank_capacity: int
-    acceleration_0_to_100_km: float
-    max_speed_km_per_hour: int
-    fuel_grade: int
-    year: int
-    type_of_car: int
-    car_name: str
-
-
-class SPBU_Data(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    gas_station: str
-    fuel_type: str
-    fuel_grade: int
-    fuel_price: int
-
-
-model = tf.keras.models.load_model("model.h5")
-scaler = joblib.load("scaler.joblib")
-
-# SQLModel setup
-SQLModel.metadata.create_all(db_engine)
-
-
-# Firebase setup
-firebase_cred = credentials.Certificate(
-    "core/keys/lut-fuel-firebase-adminsdk-aftnm-274f94905c.json"
+# The model and scaler are attached by the "model" startup step.
+predictor = BatchedPredictor(
+    None,
+    max_batch_size=int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "32")),
+    max_wait_ms=float(os.getenv("INFERENCE_MAX_WAIT_MS", "5")),
+)
+efficiency = EfficiencyTable(
+    predictor,
+    MODEL_PATH,
+    SCALER_PATH,
+    persist_session=async_session if env_flag("EFFICIENCY_PERSIST", False) else None,
+    check_interval=float(os.getenv("EFFICIENCY_CHECK_INTERVAL", "60")),
+)
+catalog = Catalog(
+    check_interval=float(os.getenv("CATALOG_CHECK_INTERVAL", "30")),
+    ttl=float(os.getenv("CATALOG_TTL", "3600")),
 )
-firebase_admin.initialize_app(firebase_cred)
+car_search = CarSearch()
+# Versions must be shared for a write on one instance to invalidate the
+# others, so caching needs Redis unless the app runs as a single instance.
+user_responses = UserResponseCache(
+    (
+        UserVersions(redis_url=os.getenv("CACHE_REDIS_URL"))
+        if os.getenv("CACHE_REDIS_URL") or env_flag("RESPONSE_CACHE_SINGLE_INSTANCE", False)
+        else None
+    ),
+    create_cache(
+        "responses",
+        max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "10000")),
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", "600")),
+        redis_url=os.getenv("CACHE_REDIS_URL"),
+    ),
+)
+
+
+# Schema changes are applied by migrate.py, not at startup.
+
+
+@startup.step("firebase")
+async def init_firebase():
+    await asyncio.to_thread(
+        lambda: firebase_admin.initialize_app(
+            credentials.Certificate(FIREBASE_CREDENTIALS_PATH)
+        )
+    )
+
+
+@startup.step("certs")
+async def prefetch_certs():
+    await token_verifier.certs.refresh()
+    token_verifier.certs.start()
+
+
+@startup.step("model")
+async def init_model():
+    model, scaler = await asyncio.gather(
+        asyncio.to_thread(load_model, MODEL_PATH),
+        asyncio.to_thread(joblib.load, SCALER_PATH),
+    )
+    predictor.model = model
+    predictor.preprocess = scaler.transform
+
+
+@startup.step("efficiency", depends=("model",))
+async def init_efficiency():
+    async with async_session() as session:
+        await efficiency.refresh(session, True)
+
+
+@startup.step("catalog")
+async def init_catalog():
+    async with async_session() as session:
+        await session.run_sync(catalog.refresh, True)
+
+
+@startup.step("geocoder")
+async def init_geocoder():
+    await asyncio.to_thread(load_local_geocoder)
+
+
+@startup.step("distance")
+async def init_distance():
+    await asyncio.to_thread(load_road_graph)
+    async with async_session() as session:
+        await session.run_sync(distance_estimator.load_history)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.start()
+    yield
+    await startup.stop()
+    await predictor.close()
+    await token_verifier.certs.stop()
+    await maps.close()
+    await route_cache.close()
+    await place_search.cache.close()
+    await user_responses.close()
 
 
 # FastAPI setup
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(TelemetryMiddleware)
 
 app.include_router(dummy_router)
 
 
+@app.exception_handler(MapsError)
+async def maps_error(request: Request, error: MapsError):
+    # No route between the points is the caller's problem; anything else is Google's.
+    status_code = 404 if error.status in NO_ROUTE_STATUSES else 502
+    return JSONResponse(status_code=status_code, content={"detail": str(error)})
+
+
+async def get_catalog(session: AsyncSession = Depends(get_session)) -> Catalog:
+    await startup.wait("catalog")
+    await session.run_sync(catalog.refresh)
+    return catalog
+
+
+@app.get("/ready")
+async def ready():
+    status_code = 200 if startup.ready else 503
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "message": "Ready" if startup.ready else "Warming up",
+            "data": startup.snapshot(),
+        },
+    )
+
+
+async def build_with_session(build, *args) -> dict:
+    async with async_session() as session:
+        return await build(session, *args)
+
+
 @app.get("/home")
-async def home(
-    user_id: str = Depends(get_user_id),
-):
-    with Session(db_engine) as session:
-        query = select(History).where(History.user_id.ilike(f"%{user_id}%"))
-        history_data = session.exec(query).all()
-        distance_traveled = 0
-        fuel_consumed = 0
-        for history in history_data:
-            distance_traveled += history.distance
-            fuel_consumed += history.fuel_needed
-
-        query = (
-            select(CarOwnership)
-            .where(CarOwnership.user_id.ilike(f"%{user_id}%"))
-            .offset(0)
-            .limit(4)
-        )
-        cars_ownership = session.exec(query).all()
-        cars_ownership_data = [
+async def home(request: Request, user_id: str = Depends(get_user_id)):
+    return await user_responses.respond(
+        request, user_id, lambda: build_with_session(home_data, user_id)
+    )
+
+
+async def home_data(session: AsyncSession, user_id: str) -> dict:
+    stats = await session.get(UserStats, user_id) or UserStats(user_id=user_id)
+
+    query = (
+        select(CarOwnership)
+        .where(CarOwnership.user_id == user_id)
+        .offset(0)
+        .limit(4)
+    )
+    cars_ownership = (await session.exec(query)).all()
+    cars_ownership_data = [
+        {
+            "customName": car.custom_name,
+            "fuelType": car.fuel_grade,
+        }
+        for car in cars_ownership
+    ]
+
+    query = (
+        select(History)
+        .options(joinedload(History.car))
+        .where(History.user_id == user_id)
+        .offset(0)
+        .limit(4)
+    )
+    history_data = []
+    for history in (await session.exec(query)).all():
+        history_data.append(
             {
-                "customName": car.custom_name,
-                "fuelType": car.fuel_grade,
+                "id": history.id,
+                "carName": history.car.car_name,
+                "from": history.from_location,
+                "destination": history.destination,
+                "fuelNeeded": history.fuel_needed,
+                "cost": history.fuel_cost,
             }
-            for car in cars_ownership
-        ]
-
-        query = (
-            select(History)
-            .where(History.user_id.ilike(f"%{user_id}%"))
-            .offset(0)
-            .limit(4)
         )
-        history_data = []
-        for history in session.exec(query).all():
-            car = session.query(Car).filter(Car.id == history.car_id).first()
-            history_data.append(
-                {
-                    "id": history.id,
-                    "carName": car.car_name,
-                    "from": history.from_location,
-                    "destination": history.destination,
-                    "fuelNeeded": history.fuel_needed,
-                    "cost": history.fuel_cost,
-                }
-            )
 
     return {
         "message": "Home fetched successfully",
         "data": {
             "stats": {
-                "distanceTraveled": distance_traveled,
-                "fuelConsumed": fuel_consumed,
+                "distanceTraveled": stats.total_distance,
+                "fuelConsumed": stats.total_fuel,
             },
             "cars": cars_ownership_data,
             "history": history_data,
@@ -156,128 +259,150 @@ async def home(
 
 @app.get("/history")
 async def history(
+    request: Request,
     user_id: str = Depends(get_user_id),
     page: int = 0,
     size: int = 20,
+    cursor: Optional[str] = None,
 ):
-    with Session(db_engine) as session:
-        query = (
-            select(History)
-            .where(History.user_id.ilike(f"%{user_id}%"))
-            .offset(page * size)
-            .limit(size)
+    return await user_responses.respond(
+        request,
+        user_id,
+        lambda: build_with_session(history_page, user_id, page, size, cursor),
+    )
+
+
+async def history_page(
+    session: AsyncSession, user_id: str, page: int, size: int, cursor: Optional[str]
+) -> dict:
+    query = (
+        select(History)
+        .options(joinedload(History.car))
+        .where(History.user_id == user_id)
+    )
+    histories = (
+        await session.exec(paginate(query, History.id, page, size, cursor))
+    ).all()
+    history_data = []
+    for history in histories:
+        history_data.append(
+            {
+                "id": history.id,
+                "carName": history.car.car_name,
+                "from": history.from_location,
+                "destination": history.destination,
+                "fuelNeeded": history.fuel_needed,
+                "cost": history.fuel_cost,
+            }
         )
-        history_data = []
-        for history in session.exec(query).all():
-            car = session.query(Car).filter(Car.id == history.car_id).first()
-            history_data.append(
-                {
-                    "id": history.id,
-                    "carName": car.car_name,
-                    "from": history.from_location,
-                    "destination": history.destination,
-                    "fuelNeeded": history.fuel_needed,
-                    "cost": history.fuel_cost,
-                }
-            )
     return {
         "message": "History fetched successfully",
         "data": history_data,
+        "nextCursor": next_cursor(histories, size),
     }
 
 
+@app.get("/history/export")
+async def history_export(
+    user_id: str = Depends(get_user_id),
+    format: str = "csv",
+    chunkSize: int = 1000,
+):
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    return StreamingResponse(
+        stream_history(async_session, user_id, format, max(1, min(chunkSize, 10_000))),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="history.{format}"'},
+    )
+
+
 @app.get("/history/{id}")
 async def history_detail(
     id: int,
+    request: Request,
     user_id: str = Depends(get_user_id),
 ):
-    with Session(db_engine) as session:
-        query = select(History).where(History.id == id)
-        history = session.exec(query).first()
-        history_data = {
-            "id": history.id,
-            "carCustomName": history.car_custom_name,
-            "fuelId": history.fuel_id,
-            "distance": history.distance,
-            "from": history.from_location,
-            "destination": history.destination,
-            "fuelNeeded": history.fuel_needed,
-            "fuelCost": history.fuel_cost,
-            "tollCost": history.toll_cost,
-            "totalCost": history.fuel_cost + history.toll_cost,
-        }
-        query = select(Car).where(Car.id == history.car_id)
-        car = session.exec(query).first()
-        history_data.update(
-            {
-                "carName": car.car_name,
-                "cyliner": car.number_of_cylinders,
-                "engineVolume": car.engine_type,
-                "power": car.engine_horse_power,
-                "weight": car.engine_horse_power_rpm,
-            }
-        )
-        query = select(SPBU_Data).where(SPBU_Data.id == history.fuel_id)
-        fuel = session.exec(query).first()
-        history_data.update(
-            {
-                "fuelType": fuel.fuel_type,
-            }
-        )
+    return await user_responses.respond(
+        request, user_id, lambda: build_with_session(history_detail_data, id)
+    )
+
+
+async def history_detail_data(session: AsyncSession, id: int) -> dict:
+    catalog = await get_catalog(session)
+    query = select(History).where(History.id == id)
+    history = (await session.exec(query)).first()
+    car = catalog.car(history.car_id)
+    history_data = {
+        "id": history.id,
+        "carCustomName": history.car_custom_name,
+        "fuelId": history.fuel_id,
+        "distance": history.distance,
+        "from": history.from_location,
+        "destination": history.destination,
+        "fuelNeeded": history.fuel_needed,
+        "fuelCost": history.fuel_cost,
+        "tollCost": history.toll_cost,
+        "totalCost": history.fuel_cost + history.toll_cost,
+        "carName": car.car_name,
+        "cyliner": car.number_of_cylinders,
+        "engineVolume": car.engine_type,
+        "power": car.engine_horse_power,
+        "weight": car.engine_horse_power_rpm,
+        "fuelType": catalog.fuel(history.fuel_id).fuel_type,
+    }
 
     return {"message": "Cost calculated successfully", "data": history_data}
 
 
 @app.get("/users-car")
 async def users_car(
+    request: Request,
     user_id: str = Depends(get_user_id),
     page: int = 0,
     size: int = 20,
+    cursor: Optional[str] = None,
 ):
-    with Session(db_engine) as session:
-        query = (
-            select(CarOwnership)
-            .where(CarOwnership.user_id.ilike(f"%{user_id}%"))
-            .offset(page * size)
-            .limit(size)
-        )
-        cars_ownership = session.exec(query).all()
-        cars_ownership_data = [
-            {
-                "id": car.id,
-                "customName": car.custom_name,
-                "fuelGrade": car.fuel_grade,
-            }
-            for car in cars_ownership
-        ]
-        query = select(Car).where(Car.id.in_([car.car_id for car in cars_ownership]))
-        cars = session.exec(query).all()
-        cars_data = [
-            {
-                "carName": car.car_name,
-                "cylinder": car.number_of_cylinders,
-                "engineVolume": car.engine_type,
-                "power": car.engine_horse_power,
-                "weight": car.engine_horse_power_rpm,
-            }
-            for car in cars
-        ]
-        for i in range(len(cars_ownership_data)):
-            if i < len(cars_data):
-                cars_ownership_data[i].update(cars_data[i])
-                query = select(SPBU_Data).where(
-                    SPBU_Data.id == cars_ownership_data[i]["fuelGrade"]
-                )
-                fuel = session.exec(query).first()
-                cars_ownership_data[i].update(
-                    {
-                        "fuelType": fuel.fuel_type,
-                    }
-                )
+    return await user_responses.respond(
+        request,
+        user_id,
+        lambda: build_with_session(users_car_page, user_id, page, size, cursor),
+    )
+
+
+async def users_car_page(
+    session: AsyncSession, user_id: str, page: int, size: int, cursor: Optional[str]
+) -> dict:
+    catalog = await get_catalog(session)
+    query = select(CarOwnership).where(CarOwnership.user_id == user_id)
+    ownerships = (
+        await session.exec(paginate(query, CarOwnership.id, page, size, cursor))
+    ).all()
+    cars_ownership_data = []
+    for ownership in ownerships:
+        data = {
+            "id": ownership.id,
+            "customName": ownership.custom_name,
+            "fuelGrade": ownership.fuel_grade,
+        }
+        car = catalog.car(ownership.car_id)
+        if car is not None:
+            data.update(
+                {
+                    "carName": car.car_name,
+                    "cylinder": car.number_of_cylinders,
+                    "engineVolume": car.engine_type,
+                    "power": car.engine_horse_power,
+                    "weight": car.engine_horse_power_rpm,
+                    "fuelType": catalog.fuel(ownership.fuel_grade).fuel_type,
+                }
+            )
+        cars_ownership_data.append(data)
 
     return {
         "message": "User's car list fetched successfully",
         "data": cars_ownership_data,
+        "nextCursor": next_cursor(ownerships, size),
     }
 
 
@@ -287,26 +412,24 @@ async def search_car(
     page: int = 0,
     size: int = 20,
     q: str = "",
+    cursor: Optional[str] = None,
+    catalog: Catalog = Depends(get_catalog),
 ):
-    with Session(db_engine) as session:
-        query = (
-            select(Car)
-            .where(Car.car_name.ilike(f"%{q}%"))
-            .offset(page * size)
-            .limit(size)
-        )
-        cars = session.exec(query).all()
-        car_data = [
-            {
-                "id": car.id,
-                "carName": car.car_name,
-            }
-            for car in cars
-        ]
+    # Results are ranked, so the cursor carries the rank offset rather than an id.
+    offset = decode_offset(cursor) if cursor else page * size
+    car_ids = car_search.search(catalog, q, offset, size)
+    car_data = [
+        {
+            "id": car_id,
+            "carName": catalog.car(car_id).car_name,
+        }
+        for car_id in car_ids
+    ]
 
     return {
         "message": "Car list fetched successfully",
         "data": car_data,
+        "nextCursor": encode_cursor(offset + size) if len(car_ids) == size else None,
     }
 
 
@@ -320,6 +443,7 @@ class AddUserCarRequest(BaseModel):
 async def add_user_car(
     request: AddUserCarRequest,
     user_id: str = Depends(get_user_id),
+    session: AsyncSession = Depends(get_session),
 ):
     car_ownership = CarOwnership(
         user_id=user_id,
@@ -328,9 +452,9 @@ async def add_user_car(
         fuel_grade=request.fuelId,
     )
 
-    with Session(db_engine) as session:
-        session.add(car_ownership)
-        session.commit()
+    session.add(car_ownership)
+    await session.commit()
+    await user_responses.invalidate(user_id)
     return {"message": "User's car added successfully"}
 
 
@@ -338,12 +462,13 @@ async def add_user_car(
 async def delete_user_car(
     id: int,
     user_id: str = Depends(get_user_id),
+    session: AsyncSession = Depends(get_session),
 ):
-    with Session(db_engine) as session:
-        query = select(CarOwnership).where(CarOwnership.id == id)
-        car_ownership = session.exec(query).first()
-        session.delete(car_ownership)
-        session.commit()
+    query = select(CarOwnership).where(CarOwnership.id == id)
+    car_ownership = (await session.exec(query)).first()
+    await session.delete(car_ownership)
+    await session.commit()
+    await user_responses.invalidate(user_id)
     return {"message": "User's car deleted successfully"}
 
 
@@ -352,7 +477,19 @@ async def search_loc(
     q: str,
     user_id: str = Depends(get_user_id),
 ):
-    return {"message": "Location list fetched successfully", "data": search_location(q)}
+    return {"message": "Location list fetched successfully", "data": await search_location(q)}
+
+
+@app.get("/location/name")
+async def location_name(
+    latitude: float,
+    longitude: float,
+    user_id: str = Depends(get_user_id),
+):
+    return {
+        "message": "Location name fetched successfully",
+        "data": await reverse_geocode(latitude, longitude),
+    }
 
 
 @app.get("/routes")
@@ -362,11 +499,45 @@ async def get_route(
     fromLongitude: float = 0,
     destinationLatitude: float = 0,
     destinationLongitude: float = 0,
+    encoding: str = "google",
+    tolerance: float = float(os.getenv("POLYLINE_TOLERANCE_M", "5")),
 ):
+    if encoding not in ENCODINGS:
+        raise HTTPException(
+            status_code=400, detail=f"encoding must be one of {', '.join(ENCODINGS)}"
+        )
+    routes = await get_routes(
+        fromLatitude, fromLongitude, destinationLatitude, destinationLongitude
+    )
+    if encoding != "google":
+        for route in routes:
+            route.polyline = [
+                transcode(polyline, encoding, tolerance) for polyline in route.polyline
+            ]
     return {
         "message": "Routes fetched successfully",
-        "data": get_routes(
-            fromLatitude, fromLongitude, destinationLatitude, destinationLongitude
+        "data": [route.dict(exclude={"steps"}) for route in routes],
+        "encoding": encoding,
+    }
+
+
+@app.get("/routes/estimate")
+async def route_estimate(
+    user_id: str = Depends(get_user_id),
+    fromLatitude: float = 0,
+    fromLongitude: float = 0,
+    destinationLatitude: float = 0,
+    destinationLongitude: float = 0,
+):
+    await startup.wait("distance")
+    return {
+        "message": "Route estimated successfully",
+        "data": await asyncio.to_thread(
+            distance_estimator.estimate,
+            fromLatitude,
+            fromLongitude,
+            destinationLatitude,
+            destinationLongitude,
         ),
     }
 
@@ -432,36 +603,115 @@ class NewCarRequest(BaseModel):
 
 
 @app.get("/car-data")
-async def car_data(car_id: int):
-    with Session(db_engine) as session:
-        car = session.get(Car, car_id)
-    return car
+async def car_data(
+    car_id: int,
+    catalog: Catalog = Depends(get_catalog),
+):
+    car = catalog.car(car_id)
+    return car.dict() if car is not None else None
 
 
-@app.post("/predict/", response_model=PredictionResponse)
-async def predict(car_id: int, fuel_id: int, dist: float):
-    with Session(db_engine) as session:
-        car_input = session.get(Car, car_id)
-        fuel_input = session.get(SPBU_Data, fuel_id)
-
-    input_data = np.array(
-        [
-            [
-                car_input.number_of_cylinders,
-                car_input.engine_type,
-                car_input.engine_horse_power,
-                car_input.engine_horse_power_rpm,
-                car_input.transmission,
-                car_input.fuel_tank_capacity,
-                car_input.acceleration_0_to_100_km,
-                fuel_input.fuel_grade,
-            ]
-        ]
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    out = PrometheusText()
+    http_metrics.write(out)
+
+    out.histogram("db_query_seconds", pool_metrics.query_ms, scale=0.001, help="DB query time")
+    out.histogram(
+        "db_pool_checkout_wait_seconds",
+        pool_metrics.checkout_wait_ms,
+        scale=0.001,
+        help="Wait for a pooled connection",
     )
+    out.sample("db_pool_timeouts_total", "counter", pool_metrics.timeouts)
+    for engine, pool in pool_metrics.snapshot()["pools"].items():
+        out.snapshot("db_pool", pool, {"engine": engine})
+
+    inference = predictor.metrics
+    out.sample("inference_batches_total", "counter", inference.batches)
+    out.sample("inference_requests_total", "counter", inference.requests)
+    out.sample("inference_errors_total", "counter", inference.errors)
+    out.sample("efficiency_persist_errors_total", "counter", efficiency.persist_errors)
+    out.histogram("inference_batch_size", inference.batch_size)
+    out.histogram("inference_queue_wait_seconds", inference.queue_wait_ms, scale=0.001)
+    out.histogram("inference_forward_seconds", inference.forward_ms, scale=0.001)
+
+    caches = {
+        "routes": route_cache.stats.snapshot(),
+        "places": place_search.snapshot(),
+        "geocode": geocode_stats.snapshot(),
+        "responses": user_responses.snapshot(),
+        "auth_tokens": token_verifier.cache.snapshot(),
+    }
+    for name, stats in caches.items():
+        out.snapshot("cache", stats, {"cache": name})
+    out.snapshot("distance_estimator", {"samples": distance_estimator.size})
+    out.sample("ready", "gauge", startup.ready)
+
+    return PlainTextResponse(out.render(), media_type="text/plain; version=0.0.4")
 
-    scaled_input = scaler.transform(input_data)
-    prediction = model.predict(scaled_input)
-    predicted_value = prediction[0][0]
+
+@app.get("/metrics/inference")
+async def inference_metrics():
+    return {
+        "message": "Inference metrics fetched successfully",
+        "data": predictor.metrics.snapshot(),
+    }
+
+
+@app.get("/metrics/db")
+async def db_metrics():
+    return {
+        "message": "Database metrics fetched successfully",
+        "data": pool_metrics.snapshot(),
+    }
+
+
+@app.get("/metrics/auth")
+async def auth_metrics():
+    return {
+        "message": "Auth metrics fetched successfully",
+        "data": token_verifier.cache.snapshot(),
+    }
+
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    return {
+        "message": "Cache metrics fetched successfully",
+        "data": {
+            "routes": route_cache.stats.snapshot(),
+            "places": place_search.snapshot(),
+            "geocode": geocode_stats.snapshot(),
+            "responses": user_responses.snapshot(),
+        },
+    }
+
+
+@app.get("/metrics/distance")
+async def distance_metrics():
+    return {
+        "message": "Distance estimator metrics fetched successfully",
+        "data": distance_estimator.snapshot(),
+    }
+
+
+@app.post("/predict/", response_model=PredictionResponse)
+async def predict(
+    car_id: int,
+    fuel_id: int,
+    dist: float,
+    session: AsyncSession = Depends(get_session),
+    catalog: Catalog = Depends(get_catalog),
+):
+    await startup.wait("efficiency")
+    fuel_input = catalog.fuel(fuel_id)
+    await efficiency.refresh(session)
+    predicted_value = efficiency.lookup(car_id, fuel_input.fuel_grade)
+    if predicted_value is None:
+        predicted_value = await predictor.predict(
+            car_features(catalog.car(car_id), fuel_input.fuel_grade)
+        )
 
     total_fuel = dist / predicted_value
     cost_total = total_fuel * fuel_input.fuel_price
@@ -473,6 +723,79 @@ async def predict(car_id: int, fuel_id: int, dist: float):
     }
 
 
+@app.get("/what-if")
+async def what_if(
+    distance: float,
+    scope: str = "fleet",
+    maker: Optional[str] = None,
+    year: Optional[int] = None,
+    typeOfCar: Optional[int] = None,
+    topK: int = 20,
+    sortBy: str = "cost",
+    user_id: str = Depends(get_user_id),
+    session: AsyncSession = Depends(get_session),
+    catalog: Catalog = Depends(get_catalog),
+):
+    if scope not in ("fleet", "mine"):
+        raise HTTPException(status_code=400, detail="scope must be 'fleet' or 'mine'")
+    if sortBy not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail="sortBy must be 'cost' or 'fuel'")
+    if distance < 0 or topK < 1:
+        raise HTTPException(status_code=400, detail="distance and topK must be positive")
+
+    ownerships = [None] * len(catalog.cars)
+    cars = list(catalog.cars.values())
+    if scope == "mine":
+        query = select(CarOwnership).where(CarOwnership.user_id == user_id)
+        ownerships = [
+            ownership
+            for ownership in (await session.exec(query)).all()
+            if catalog.car(ownership.car_id) is not None
+        ]
+        cars = [catalog.car(ownership.car_id) for ownership in ownerships]
+    mask = car_mask(cars, maker, year, typeOfCar)
+    rows = [row for row, keep in zip(zip(cars, ownerships), mask) if keep]
+    cars = [car for car, _ in rows]
+
+    fuels = list(catalog.fuels.values())
+    grades = sorted({fuel.fuel_grade for fuel in fuels})
+    grade_index = {grade: i for i, grade in enumerate(grades)}
+    fuel_columns = np.array([grade_index[fuel.fuel_grade] for fuel in fuels], dtype=np.int64)
+    fuel_prices = np.array([fuel.fuel_price for fuel in fuels], dtype=np.float64)
+
+    await startup.wait("efficiency")
+    await efficiency.refresh(session)
+    km_per_liter = await asyncio.to_thread(
+        km_per_liter_matrix, efficiency, predictor, cars, grades
+    )
+    car_rows, fuel_rows, fuel_needed, fuel_cost = rank_costs(
+        km_per_liter, fuel_columns, fuel_prices, distance, topK, sortBy
+    )
+
+    results = []
+    for car_row, fuel_row, needed, cost in zip(car_rows, fuel_rows, fuel_needed, fuel_cost):
+        car, ownership = rows[car_row]
+        fuel = fuels[fuel_row]
+        data = {
+            "carId": car.id,
+            "carName": car.car_name,
+            "maker": car.maker,
+            "year": car.year,
+            "typeOfCar": car.type_of_car,
+            "fuelId": fuel.id,
+            "fuelType": fuel.fuel_type,
+            "gasStation": fuel.gas_station,
+            "kmPerLiter": float(km_per_liter[car_row, fuel_columns[fuel_row]]),
+            "fuelNeeded": float(needed),
+            "fuelCost": float(cost),
+        }
+        if ownership is not None:
+            data.update({"userCarId": ownership.id, "customName": ownership.custom_name})
+        results.append(data)
+
+    return {"message": "What-if costs calculated successfully", "data": results}
+
+
 from typing import Optional
 from pydantic import BaseModel
 
@@ -483,29 +806,67 @@ class CalculateCostRequest(BaseModel):
     # fuelId: int
     # carCustomname: Optional[str] = None
     distance: float
-    fromLocation: str
-    destination: str
+    # Named from the coordinates when left empty
+    fromLocation: str = ""
+    destination: str = ""
     fromLat: float
     fromLang: float
     destinationLat: float
     destinationLang: float
     tolls: bool
     tollCost: float = 10000
+    # Price fuel per route segment instead of over the flat distance
+    profile: bool = False
+    profileBins: int = 20
+
+
+async def fill_location_names(request: CalculateCostRequest):
+    if not request.fromLocation:
+        request.fromLocation = await reverse_geocode(request.fromLat, request.fromLang)
+    if not request.destination:
+        request.destination = await reverse_geocode(
+            request.destinationLat, request.destinationLang
+        )
+
+
+async def trip_profile(
+    request: CalculateCostRequest, km_per_liter: float, fuel_price: float
+) -> dict:
+    routes = await get_routes(
+        request.fromLat, request.fromLang, request.destinationLat, request.destinationLang
+    )
+    route = next(
+        (route for route in routes if route.id == (0 if request.tolls else 1)), routes[0]
+    )
+    return fuel_profile(
+        *route_segments(route), km_per_liter, fuel_price, max(1, request.profileBins)
+    )
 
 
 @app.post("/calculate-cost")
 async def calculate_cost(
     request: CalculateCostRequest,
     user_id: str = Depends(get_user_id),
+    session: AsyncSession = Depends(get_session),
+    catalog: Catalog = Depends(get_catalog),
 ):
-    with Session(db_engine) as session:
-        query = select(CarOwnership).where(CarOwnership.id == request.userCarId)
-        carOwnership = session.exec(query).first()
+    await fill_location_names(request)
+    query = select(CarOwnership).where(CarOwnership.id == request.userCarId)
+    carOwnership = (await session.exec(query)).first()
     prediction = await predict(
-        carOwnership.car_id, carOwnership.fuel_grade, request.distance
+        carOwnership.car_id, carOwnership.fuel_grade, request.distance, session, catalog
     )
     fuel_consumption = prediction["total fuel"]
     fuel_cost = prediction["total cost"]
+    profile = None
+    if request.profile:
+        profile = await trip_profile(
+            request,
+            prediction["prediction"],
+            catalog.fuel(carOwnership.fuel_grade).fuel_price,
+        )
+        fuel_consumption = profile["fuelNeeded"]
+        fuel_cost = profile["fuelCost"]
     toll_cost = request.tollCost
     # if request.tolls:
     #     toll_cost = calculate_toll_cost(
@@ -524,30 +885,32 @@ async def calculate_cost(
         fuel_cost=float(fuel_cost),
         toll_cost=request.tollCost,
         user_id=user_id,
+        from_lat=request.fromLat,
+        from_lng=request.fromLang,
+        destination_lat=request.destinationLat,
+        destination_lng=request.destinationLang,
     )
 
     detail_data = detail.dict()
 
-    with Session(db_engine) as session:
-        session.add(detail)
-        # session.flush()
-        session.commit()
-        session.refresh(detail)
+    session.add(detail)
+    await session.run_sync(record_trips, [detail])
+    await session.commit()
+    await user_responses.invalidate(user_id)
+    await session.refresh(detail)
 
-        query = select(Car).where(Car.id == carOwnership.car_id)
-        car = session.exec(query).first()
-        detail_data.update(
-            {
-                "carName": car.car_name,
-            }
-        )
-        query = select(SPBU_Data).where(SPBU_Data.id == carOwnership.fuel_grade)
-        fuel = session.exec(query).first()
-        detail_data.update(
-            {
-                "fuelType": fuel.fuel_type,
-            }
-        )
+    car = catalog.car(carOwnership.car_id)
+    detail_data.update(
+        {
+            "carName": car.car_name,
+        }
+    )
+    fuel = catalog.fuel(carOwnership.fuel_grade)
+    detail_data.update(
+        {
+            "fuelType": fuel.fuel_type,
+        }
+    )
 
     return {
         "message": "Cost calculated successfully",
@@ -577,10 +940,118 @@ async def calculate_cost(
             "weight": car.engine_horse_power_rpm,
             "cyliner": car.number_of_cylinders,
             "power": car.engine_horse_power,
+            "fuelProfile": profile,
         },
     }
 
 
+# Each item may geocode twice and writes a History row.
+MAX_BATCH_SIZE = 100
+
+
+@app.post("/calculate-cost/batch")
+async def calculate_cost_batch(
+    requests: list[CalculateCostRequest],
+    user_id: str = Depends(get_user_id),
+    session: AsyncSession = Depends(get_session),
+    catalog: Catalog = Depends(get_catalog),
+):
+    if len(requests) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"At most {MAX_BATCH_SIZE} trips per batch"
+        )
+    await asyncio.gather(*(fill_location_names(request) for request in requests))
+    results = [None] * len(requests)
+    await startup.wait("efficiency")
+    await efficiency.refresh(session)
+    query = select(CarOwnership).where(
+        CarOwnership.id.in_({request.userCarId for request in requests})
+    )
+    ownerships = {
+        ownership.id: ownership for ownership in (await session.exec(query)).all()
+    }
+
+    items = []
+    for i, request in enumerate(requests):
+        ownership = ownerships.get(request.userCarId)
+        if ownership is None:
+            results[i] = {"index": i, "error": "Car ownership not found"}
+            continue
+        car = catalog.car(ownership.car_id)
+        fuel = catalog.fuel(ownership.fuel_grade)
+        if car is None or fuel is None:
+            results[i] = {"index": i, "error": "Car or fuel data not found"}
+            continue
+        items.append((i, request, ownership, car, fuel))
+
+    km_per_liter = [efficiency.lookup(car.id, fuel.fuel_grade) for _, _, _, car, fuel in items]
+    misses = [j for j, value in enumerate(km_per_liter) if value is None]
+    if misses:
+        inputs = np.stack(
+            [car_features(items[j][3], items[j][4].fuel_grade) for j in misses]
+        )
+        for j, value in zip(misses, await asyncio.to_thread(predictor.forward, inputs)):
+            km_per_liter[j] = float(value)
+
+    details = []
+    for (i, request, ownership, car, fuel), prediction in zip(items, km_per_liter):
+        fuel_needed = request.distance / prediction
+        details.append(
+            History(
+                car_id=ownership.car_id,
+                fuel_id=ownership.fuel_grade,
+                car_custom_name=ownership.custom_name,
+                fuel_needed=float(fuel_needed),
+                distance=request.distance,
+                from_location=request.fromLocation,
+                destination=request.destination,
+                tolls=request.tolls,
+                fuel_cost=float(fuel_needed * fuel.fuel_price),
+                toll_cost=request.tollCost,
+                user_id=user_id,
+                from_lat=request.fromLat,
+                from_lng=request.fromLang,
+                destination_lat=request.destinationLat,
+                destination_lng=request.destinationLang,
+            )
+        )
+    session.add_all(details)
+    await session.run_sync(record_trips, details)
+    await session.flush()
+
+    for (i, request, ownership, car, fuel), detail in zip(items, details):
+        results[i] = {
+            "index": i,
+            "data": {
+                "id": detail.id,
+                "car_id": ownership.car_id,
+                "fuel_id": ownership.fuel_grade,
+                "car_name": car.car_name,
+                "carCustomName": ownership.custom_name,
+                "distance": request.distance,
+                "fuelNeeded": detail.fuel_needed,
+                "from": request.fromLocation,
+                "destination": request.destination,
+                "tolls": request.tolls,
+                "fuelCost": detail.fuel_cost,
+                "tollCost": request.tollCost,
+                "user_id": user_id,
+                "totalCost": detail.fuel_cost + request.tollCost,
+                "fuelType": fuel.fuel_type,
+                "engineVolume": car.engine_type,
+                "carName": car.car_name,
+                "weight": car.engine_horse_power_rpm,
+                "cyliner": car.number_of_cylinders,
+                "power": car.engine_horse_power,
+            },
+        }
+    await session.commit()
+    if details:
+        await user_responses.invalidate(user_id)
+
+    return {"message": "Costs calculated successfully", "data": results}
+
+
 ## Search Location
 
 # - Route : `/location/search`
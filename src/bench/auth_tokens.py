@@ -0,0 +1,106 @@
+"""Per-request auth overhead with and without the verified-token cache.
+
+Run from `src/`: `python -m bench.auth_tokens`
+
+Mints RS256 tokens with a throwaway key, serves the matching certificate
+from a local stub endpoint, and times FirebaseTokenVerifier.verify for a
+pool of users making repeated requests.
+"""
+import asyncio
+import datetime
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from feat.auth.verifier import CertificateStore, FirebaseTokenVerifier, TokenCache
+
+
+PROJECT_ID = "lut-fuel-bench"
+KID = "bench-key"
+USERS = 200
+REQUESTS = 5_000
+
+
+def make_key_and_cert():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def serve_certs(pem: str) -> HTTPServer:
+    body = json.dumps({KID: pem}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", "public, max-age=3600")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def mint(key, uid: str) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "iat": now,
+        "exp": now + 3600,
+    }
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": KID})
+
+
+async def measure(verifier: FirebaseTokenVerifier, tokens: list[str]) -> dict:
+    await verifier.certs.refresh()
+    timings = []
+    for i in range(REQUESTS):
+        started = time.perf_counter()
+        await verifier.verify(tokens[i % len(tokens)])
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    timings.sort()
+    return {
+        "p50Us": statistics.median(timings),
+        "p99Us": timings[int(len(timings) * 0.99) - 1],
+    }
+
+
+async def main():
+    key, pem = make_key_and_cert()
+    server = serve_certs(pem)
+    url = f"http://127.0.0.1:{server.server_port}/certs"
+    tokens = [mint(key, f"user-{i}") for i in range(USERS)]
+    for size in (0, 10_000):
+        verifier = FirebaseTokenVerifier(CertificateStore(url), TokenCache(size), PROJECT_ID)
+        print(f"cache size {size}:", await measure(verifier, tokens))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""Car search latency on a synthetic 100k-car catalog.
+
+Run from `src/`: `python -m bench.car_search`
+Set BENCH_DATABASE_URL to also time the old `car_name ILIKE '%q%'` query
+against the same catalog loaded into a scratch `bench_car` table.
+"""
+import os
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+
+from core.search import CarSearchIndex
+
+
+CARS = 100_000
+RUNS = 500
+MAKERS = ["Toyota", "Honda", "Suzuki", "Daihatsu", "Mitsubishi", "Nissan", "Mazda", "Hyundai", "Wuling", "BMW"]
+MODELS = ["Avanza", "Brio", "Ertiga", "Xenia", "Xpander", "Livina", "CX-5", "Creta", "Almaz", "X5", "Supra", "Jazz", "Civic"]
+QUERIES = ["avanza", "avnza", "honda civic", "toyota sup", "xpander 2019", "mazda cx", "wulin almaz", "brio"]
+
+
+def make_cars() -> list:
+    random.seed(0)
+    cars = []
+    for i in range(1, CARS + 1):
+        maker = random.choice(MAKERS)
+        model = random.choice(MODELS)
+        year = random.randint(1995, 2024)
+        trim = random.choice(["", " G", " E", " RS", " Sport", " Hybrid"])
+        cars.append(
+            SimpleNamespace(id=i, maker=maker, model=model, car_name=f"{maker} {model}{trim} {year}")
+        )
+    return cars
+
+
+def percentiles(timings: list[float]) -> dict:
+    timings = sorted(timings)
+    return {"p50Ms": statistics.median(timings), "p99Ms": timings[int(len(timings) * 0.99) - 1]}
+
+
+def bench_index(cars: list) -> dict:
+    started = time.perf_counter()
+    index = CarSearchIndex(cars)
+    build = time.perf_counter() - started
+    timings = []
+    for i in range(RUNS):
+        started = time.perf_counter()
+        index.search(QUERIES[i % len(QUERIES)], 0, 20)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"buildSeconds": build, **percentiles(timings)}
+
+
+def bench_ilike(cars: list, url: str) -> dict:
+    engine = create_engine(url)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("DROP TABLE IF EXISTS bench_car"))
+        conn.execute(text("CREATE TABLE bench_car (id int PRIMARY KEY, car_name varchar)"))
+        conn.execute(
+            text("INSERT INTO bench_car VALUES (:id, :car_name)"),
+            [{"id": car.id, "car_name": car.car_name} for car in cars],
+        )
+        conn.execute(text("ANALYZE bench_car"))
+        timings = []
+        for i in range(RUNS):
+            started = time.perf_counter()
+            conn.execute(
+                text("SELECT id, car_name FROM bench_car WHERE car_name ILIKE :q ORDER BY id LIMIT 20"),
+                {"q": f"%{QUERIES[i % len(QUERIES)]}%"},
+            ).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        conn.execute(text("DROP TABLE bench_car"))
+    return percentiles(timings)
+
+
+if __name__ == "__main__":
+    cars = make_cars()
+    print("trigram index:", bench_index(cars))
+    if os.getenv("BENCH_DATABASE_URL"):
+        print("ILIKE:", bench_ilike(cars, os.environ["BENCH_DATABASE_URL"]))
@@ -0,0 +1,60 @@
+"""Time from process launch to first response and to readiness.
+
+Run from `src/`: `python -m bench.cold_start`
+
+Starts `uvicorn app:app` in a fresh process and polls /ready: the first
+answer of any status is time-to-first-response, the first 200 is
+time-to-ready. Repeats RUNS times and prints each run.
+"""
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+RUNS = 3
+TIMEOUT = 120.0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure() -> dict:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    first_response = None
+    try:
+        while time.perf_counter() - started < TIMEOUT:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/ready", timeout=1)
+            except httpx.TransportError:
+                time.sleep(0.01)
+                continue
+            if first_response is None:
+                first_response = time.perf_counter() - started
+            if response.status_code == 200:
+                return {
+                    "firstResponseSeconds": first_response,
+                    "readySeconds": time.perf_counter() - started,
+                    "steps": response.json()["data"]["steps"],
+                }
+            time.sleep(0.05)
+        raise TimeoutError(f"app was not ready after {TIMEOUT} seconds")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    for run in range(RUNS):
+        print(run, measure())
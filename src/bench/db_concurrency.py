@@ -0,0 +1,73 @@
+"""Request throughput with the blocking Session vs the async engine.
+
+Run from `src/` against a local Postgres seeded by bench.user_id_filter:
+`BENCH_DATABASE_URL=postgresql://... python -m bench.db_concurrency`
+
+Each simulated client runs the /history page query in a loop inside one
+event loop, the way uvicorn runs handlers on a worker. The sync variant
+blocks the loop on every round-trip, like the old `Session(db_engine)`.
+"""
+import asyncio
+import os
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.db import async_database_url
+
+
+QUERY = text(
+    "SELECT * FROM bench_history WHERE user_id = :user_id ORDER BY id LIMIT 20"
+)
+USER_ID = "user" + "1".rjust(24, "0")
+DURATION = 5.0
+CLIENTS = (1, 10, 100)
+
+
+async def run_sync(engine, clients: int) -> float:
+    done = 0
+    deadline = time.perf_counter() + DURATION
+
+    async def client():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            with engine.connect() as conn:
+                conn.execute(QUERY, {"user_id": USER_ID}).fetchall()
+            done += 1
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return done / DURATION
+
+
+async def run_async(engine, clients: int) -> float:
+    done = 0
+    deadline = time.perf_counter() + DURATION
+
+    async def client():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            async with engine.connect() as conn:
+                (await conn.execute(QUERY, {"user_id": USER_ID})).fetchall()
+            done += 1
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return done / DURATION
+
+
+async def main():
+    url = os.environ["BENCH_DATABASE_URL"]
+    for clients in CLIENTS:
+        pool = {"pool_size": min(clients, 20), "max_overflow": 0}
+        sync_engine = create_engine(url, **pool)
+        async_engine = create_async_engine(async_database_url(url), **pool)
+        sync_rps = await run_sync(sync_engine, clients)
+        async_rps = await run_async(async_engine, clients)
+        print(f"{clients} clients: sync {sync_rps:.0f} req/s, async {async_rps:.0f} req/s")
+        sync_engine.dispose()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""Latency of deep /history pages: OFFSET vs keyset cursor.
+
+Run from `src/` against a scratch database:
+`BENCH_DATABASE_URL=postgresql://... python -m bench.deep_pages`
+
+Seeds `bench_history` with ROWS rows for a single user and an index on
+(user_id, id), then fetches pages at increasing depth both ways.
+"""
+import os
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+
+from bench.user_id_filter import seed
+
+
+ROWS = 1_000_000
+PAGE_SIZE = 20
+RUNS = 20
+DEPTHS = (0, 100, 1_000, 10_000, ROWS // PAGE_SIZE - 1)
+USER_ID = "user" + "0".rjust(24, "0")
+
+QUERIES = {
+    "offset": (
+        "SELECT * FROM bench_history WHERE user_id = :user_id "
+        "ORDER BY id OFFSET :offset LIMIT :size"
+    ),
+    "keyset": (
+        "SELECT * FROM bench_history WHERE user_id = :user_id AND id > :last_id "
+        "ORDER BY id LIMIT :size"
+    ),
+}
+
+
+def measure(conn, name: str, page: int) -> float:
+    # Seeded ids are 1..ROWS, so the last id before a page is page * size.
+    params = {
+        "user_id": USER_ID,
+        "offset": page * PAGE_SIZE,
+        "last_id": page * PAGE_SIZE,
+        "size": PAGE_SIZE,
+    }
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        conn.execute(text(QUERIES[name]), params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    engine = create_engine(os.environ["BENCH_DATABASE_URL"])
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        seed(conn, rows=ROWS, users=1)
+        conn.execute(text("CREATE INDEX ON bench_history (user_id, id)"))
+        conn.execute(text("ANALYZE bench_history"))
+        for page in DEPTHS:
+            print(
+                f"page {page}: offset {measure(conn, 'offset', page):.2f} ms, "
+                f"keyset {measure(conn, 'keyset', page):.2f} ms"
+            )
+        conn.execute(text("DROP TABLE bench_history"))
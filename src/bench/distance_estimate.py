@@ -0,0 +1,107 @@
+"""Accuracy and latency of the local distance estimator against Google.
+
+Run from `src/` with stored Google results, either a CSV with columns
+fromLat, fromLng, destinationLat, destinationLng, distanceKm, durationMin:
+`BENCH_ROUTES_CSV=routes.csv python -m bench.distance_estimate`
+or the History rows that kept their coordinates (distance only):
+`BENCH_DATABASE_URL=postgresql://... python -m bench.distance_estimate`
+
+The estimator is fitted on a random 80% of trips and scored on the rest.
+Set ROAD_GRAPH_PATH to also score the road graph router.
+"""
+import csv
+import os
+import statistics
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+from core.distance import DistanceEstimator, RoadGraph, haversine_km
+
+
+TRAIN_SHARE = 0.8
+
+
+def load_csv(path: str) -> np.ndarray:
+    with open(path, newline="") as f:
+        return np.array(
+            [
+                [
+                    float(row["fromLat"]),
+                    float(row["fromLng"]),
+                    float(row["destinationLat"]),
+                    float(row["destinationLng"]),
+                    float(row["distanceKm"]),
+                    float(row.get("durationMin") or "nan"),
+                ]
+                for row in csv.DictReader(f)
+            ]
+        )
+
+
+def load_history(url: str) -> np.ndarray:
+    with create_engine(url).connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT from_lat, from_lng, destination_lat, destination_lng, distance, "
+                "'NaN'::float FROM history WHERE from_lat IS NOT NULL "
+                "AND destination_lat IS NOT NULL AND distance > 0"
+            )
+        ).all()
+    return np.array(rows, dtype=np.float64).reshape(-1, 6)
+
+
+def errors(predicted: np.ndarray, actual: np.ndarray) -> dict:
+    known = np.isfinite(actual) & np.isfinite(predicted)
+    if not known.any():
+        return {}
+    ape = np.abs(predicted[known] - actual[known]) / actual[known] * 100
+    return {
+        "medianApePct": round(float(np.median(ape)), 1),
+        "p90ApePct": round(float(np.percentile(ape, 90)), 1),
+        "biasPct": round(float(np.median((predicted[known] / actual[known] - 1) * 100)), 1),
+    }
+
+
+def score(estimator: DistanceEstimator, trips: np.ndarray) -> dict:
+    distances, durations, timings = [], [], []
+    for lat1, lng1, lat2, lng2, _, _ in trips:
+        started = time.perf_counter()
+        estimate = estimator.estimate(lat1, lng1, lat2, lng2)
+        timings.append((time.perf_counter() - started) * 1000)
+        distances.append(estimate["distance"])
+        durations.append(estimate["duration"])
+    timings.sort()
+    return {
+        "distance": errors(np.array(distances), trips[:, 4]),
+        "duration": errors(np.array(durations), trips[:, 5]),
+        "p50Ms": round(statistics.median(timings), 3),
+        "p99Ms": round(timings[int(len(timings) * 0.99) - 1], 3),
+    }
+
+
+if __name__ == "__main__":
+    if os.getenv("BENCH_ROUTES_CSV"):
+        trips = load_csv(os.environ["BENCH_ROUTES_CSV"])
+    else:
+        trips = load_history(os.environ["BENCH_DATABASE_URL"])
+    np.random.default_rng(0).shuffle(trips)
+    split = int(len(trips) * TRAIN_SHARE)
+    train, test = trips[:split], trips[split:]
+    print(f"{len(train)} training trips, {len(test)} test trips")
+
+    straight_km = haversine_km(test[:, 0], test[:, 1], test[:, 2], test[:, 3])
+    print("haversine only:", {"distance": errors(straight_km, test[:, 4])})
+
+    estimator = DistanceEstimator(capacity=max(len(train), 1))
+    estimator.observe(
+        haversine_km(train[:, 0], train[:, 1], train[:, 2], train[:, 3]), train[:, 4], train[:, 5]
+    )
+    estimator.fit()
+    print("learned circuity:", score(estimator, test))
+    print(estimator.snapshot())
+
+    if os.getenv("ROAD_GRAPH_PATH"):
+        estimator.graph = RoadGraph.load(os.environ["ROAD_GRAPH_PATH"])
+        print("road graph, circuity fallback:", score(estimator, test))
@@ -0,0 +1,58 @@
+"""Latency of the per-segment fuel profile on long routes.
+
+Run from `src/`: `python -m bench.fuel_profile`
+
+Splits a synthetic drive into Google-style steps (a few dozen points
+each, alternating toll and surface roads at different speeds) and times
+segment extraction plus profiling.
+"""
+import statistics
+import time
+
+from bench.polyline import make_route
+from core.distance import haversine_km
+from core.fuelprofile import fuel_profile, route_segments
+from core.polyline import encode
+from get_polyline import RouteResult, RouteStep
+
+
+SEGMENTS = (1_000, 10_000, 50_000)
+POINTS_PER_STEP = 40
+RUNS = 20
+
+
+def make_result(segments: int) -> RouteResult:
+    points = make_route(segments + 1)
+    steps = []
+    for start in range(0, segments, POINTS_PER_STEP):
+        chunk = points[start : start + POINTS_PER_STEP + 1]
+        meters = haversine_km(chunk[:-1, 0], chunk[:-1, 1], chunk[1:, 0], chunk[1:, 1]).sum() * 1000
+        toll = (start // POINTS_PER_STEP) % 3 == 0
+        steps.append(
+            RouteStep(
+                polyline=encode(chunk),
+                distance=meters,
+                duration=meters / (80 if toll else 30) * 3.6,
+                toll=toll,
+            )
+        )
+    distance = sum(step.distance for step in steps) / 1000
+    duration = sum(step.duration for step in steps) / 60
+    return RouteResult(
+        id=0, name="Tolls", distance=distance, duration=duration, polyline=[], steps=steps
+    )
+
+
+if __name__ == "__main__":
+    for segments in SEGMENTS:
+        route = make_result(segments)
+        timings = []
+        for _ in range(RUNS):
+            started = time.perf_counter()
+            profile = fuel_profile(*route_segments(route), 12.0, 10000)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(
+            f"{segments} segments, {len(route.steps)} steps: "
+            f"median {statistics.median(timings):.2f} ms, "
+            f"{profile['fuelNeeded']:.2f} l over {profile['distance']:.1f} km"
+        )
@@ -0,0 +1,103 @@
+"""Memory and throughput of a history export: `stream_history` vs `.all()`.
+
+Run from `src/` against a scratch database, whose history, carownership,
+car and spbu_data tables are emptied before and after:
+`BENCH_DATABASE_URL=postgresql://... python -m bench.history_export`
+
+Migrates the schema and seeds ROWS history rows for a single user, then
+exports them as CSV through the async engine twice: once with
+`core.export.stream_history` exactly as the endpoint runs it, and once by
+loading every row with `.all()` first. Peak Python heap comes from
+tracemalloc; the streamed run goes first because ru_maxrss only ever grows.
+"""
+import asyncio
+import os
+import resource
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.db import async_database_url
+from core.export import csv_chunk, history_export_query, stream_history
+from migrate import migrate
+
+
+ROWS = 1_000_000
+CHUNK_SIZE = 1000
+USER_ID = "user" + "0".rjust(24, "0")
+# carownership references car, so it has to go too; no CASCADE, so nothing
+# beyond these four tables can be emptied.
+RESET = "TRUNCATE history, carownership, car, spbu_data RESTART IDENTITY"
+SEED_CATALOG = [
+    "INSERT INTO car (maker, model, number_of_cylinders, engine_type, engine_horse_power, "
+    "engine_horse_power_rpm, transmission, fuel_tank_capacity, acceleration_0_to_100_km, "
+    "max_speed_km_per_hour, fuel_grade, year, type_of_car, car_name) "
+    "SELECT 'Toyota', 'Model ' || i, 4, 1500, 100, 6000, 1, 45, 11, 170, 90, 2020, 1, "
+    "'Toyota Model ' || i FROM generate_series(1, 100) AS i",
+    "INSERT INTO spbu_data (gas_station, fuel_type, fuel_grade, fuel_price) "
+    "VALUES ('Pertamina', 'Pertalite', 90, 10000), ('Pertamina', 'Pertamax', 92, 12500)",
+]
+SEED_HISTORY = (
+    "INSERT INTO history (user_id, car_id, fuel_id, car_custom_name, fuel_needed, distance, "
+    "from_location, destination, tolls, fuel_cost, toll_cost) "
+    "SELECT :user_id, i % 100 + 1, i % 2 + 1, 'Car ' || i % 100, 5.5, 55.0, "
+    "'Jakarta', 'Bandung', i % 3 = 0, 55000, 0 FROM generate_series(1, :rows) AS i"
+)
+
+
+async def export_streamed(session_factory) -> int:
+    written = 0
+    async for chunk in stream_history(session_factory, USER_ID, "csv", CHUNK_SIZE):
+        written += len(chunk)
+    return written
+
+
+async def export_all(session_factory) -> int:
+    async with session_factory() as session:
+        rows = (await session.exec(history_export_query(USER_ID))).all()
+    return len(csv_chunk(rows, header=True))
+
+
+async def measure(session_factory, export) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    written = await export(session_factory)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rowsPerSecond": round(ROWS / elapsed),
+        "megabytesWritten": round(written / 2**20, 1),
+        "peakHeapMb": round(peak / 2**20, 1),
+        "maxRssMb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+async def main(url: str):
+    engine = create_async_engine(async_database_url(url))
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        print("stream_history:", await measure(session_factory, export_streamed))
+        print(".all():", await measure(session_factory, export_all))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    url = os.environ["BENCH_DATABASE_URL"]
+    engine = create_engine(url)
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(text(RESET))
+        for statement in SEED_CATALOG:
+            conn.execute(text(statement))
+        conn.execute(text(SEED_HISTORY), {"user_id": USER_ID, "rows": ROWS})
+        conn.execute(text("ANALYZE history"))
+    try:
+        asyncio.run(main(url))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(RESET))
@@ -0,0 +1,46 @@
+"""Compare the Keras and NumPy model backends.
+
+Run from `src/`: `python -m bench.model_backends`
+
+Each backend is loaded in a fresh interpreter to measure import + load time
+and resident memory. Their predictions are compared by
+tests/test_model_parity.py.
+"""
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from core.model import load_model
+
+
+MODEL_PATH = "model.h5"
+
+
+def measure_startup(backend: str) -> dict:
+    started = time.perf_counter()
+    model = load_model(MODEL_PATH, backend)
+    model.predict(np.zeros((1, 8)), verbose=0)
+    return {
+        "backend": backend,
+        "startupSeconds": time.perf_counter() - started,
+        "maxRssMb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--startup":
+        print(json.dumps(measure_startup(sys.argv[2])))
+        sys.exit(0)
+
+    for backend in ("keras", "numpy"):
+        output = subprocess.run(
+            [sys.executable, "-m", "bench.model_backends", "--startup", backend],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        print(output.strip().splitlines()[-1])
@@ -0,0 +1,93 @@
+"""Payload size and codec throughput of route polylines.
+
+Run from `src/`: `python -m bench.polyline`
+
+Builds a long synthetic drive (a smoothed random walk sampled every
+~15 m) and compares the vectorized codec with a plain-Python
+implementation of Google's algorithm, then reports payload sizes for each
+`/routes` encoding, raw and gzipped.
+"""
+import gzip
+import time
+
+import numpy as np
+
+from core.polyline import decode, encode, simplify, to_binary, transcode
+
+
+POINTS = (1_000, 10_000, 100_000)
+RUNS = 5
+TOLERANCES_M = (1, 5, 20)
+
+
+def make_route(points: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    heading = np.cumsum(rng.normal(0, 0.05, points))
+    steps = np.column_stack([np.cos(heading), np.sin(heading)]) * 0.00014
+    return np.array([-6.2, 106.8]) + np.cumsum(steps, axis=0)
+
+
+def encode_python(points) -> str:
+    out, last = [], (0, 0)
+    for lat, lng in points:
+        current = (round(lat * 1e5), round(lng * 1e5))
+        for value in (current[0] - last[0], current[1] - last[1]):
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        last = current
+    return "".join(out)
+
+
+def decode_python(polyline: str) -> list:
+    points, index, lat, lng = [], 0, 0, 0
+    while index < len(polyline):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(polyline[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat, lng = lat + deltas[0], lng + deltas[1]
+        points.append((lat / 1e5, lng / 1e5))
+    return points
+
+
+def best_ms(function, *args) -> float:
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        function(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    for points in POINTS:
+        route = make_route(points)
+        polyline = encode(route)
+        assert polyline == encode_python(route)
+        assert np.allclose(decode(polyline), np.round(route, 5))
+        print(
+            f"{points} points: encode {best_ms(encode, route):.2f} ms "
+            f"(python {best_ms(encode_python, route):.2f} ms), "
+            f"decode {best_ms(decode, polyline):.2f} ms "
+            f"(python {best_ms(decode_python, polyline):.2f} ms)"
+        )
+
+        payloads = {"google": polyline, "binary": to_binary(route)}
+        for tolerance in TOLERANCES_M:
+            payloads[f"simplified {tolerance} m"] = transcode(polyline, "simplified", tolerance)
+        print(f"  simplify 5 m: {best_ms(simplify, route, 5):.2f} ms")
+        for name, payload in payloads.items():
+            print(
+                f"  {name}: {len(payload)} bytes, "
+                f"{len(gzip.compress(payload.encode()))} gzipped"
+            )
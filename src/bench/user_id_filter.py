@@ -0,0 +1,81 @@
+"""Latency of per-user history lookups: ILIKE '%uid%' vs exact match + index.
+
+Run from `src/` against a scratch database:
+`BENCH_DATABASE_URL=postgresql://... python -m bench.user_id_filter`
+
+Seeds a `bench_history` table with ROWS rows spread over USERS user ids,
+then times the /history page query with each filter.
+"""
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+
+
+ROWS = 1_000_000
+USERS = 5_000
+RUNS = 50
+PAGE_SIZE = 20
+
+QUERIES = {
+    "ilike": "SELECT * FROM bench_history WHERE user_id ILIKE :pattern LIMIT :size",
+    "exact": "SELECT * FROM bench_history WHERE user_id = :user_id ORDER BY id LIMIT :size",
+}
+
+
+def seed(conn, rows: int = ROWS, users: int = USERS):
+    conn.execute(text("DROP TABLE IF EXISTS bench_history"))
+    conn.execute(
+        text(
+            """
+            CREATE TABLE bench_history AS
+            SELECT
+                i AS id,
+                'user' || lpad((i % :users)::text, 24, '0') AS user_id,
+                (i % 200) + 1 AS car_id,
+                (i % 5) + 1 AS fuel_id,
+                NULL::varchar AS car_custom_name,
+                random() * 20 AS fuel_needed,
+                random() * 300 AS distance,
+                'Jakarta' AS from_location,
+                'Bandung' AS destination,
+                (i % 2) = 0 AS tolls,
+                random() * 300000 AS fuel_cost,
+                10000.0 AS toll_cost
+            FROM generate_series(1, :rows) AS i
+            """
+        ),
+        {"users": users, "rows": rows},
+    )
+    conn.execute(text("ALTER TABLE bench_history ADD PRIMARY KEY (id)"))
+    conn.execute(text("ANALYZE bench_history"))
+
+
+def measure(conn, name: str) -> dict:
+    timings = []
+    for _ in range(RUNS):
+        user_id = "user" + str(random.randrange(USERS)).rjust(24, "0")
+        params = {"user_id": user_id, "pattern": f"%{user_id}%", "size": PAGE_SIZE}
+        started = time.perf_counter()
+        conn.execute(text(QUERIES[name]), params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50Ms": statistics.median(timings),
+        "p99Ms": timings[int(len(timings) * 0.99) - 1],
+    }
+
+
+if __name__ == "__main__":
+    engine = create_engine(os.environ["BENCH_DATABASE_URL"])
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        seed(conn)
+        print("ilike, no index:", measure(conn, "ilike"))
+        print("exact, no index:", measure(conn, "exact"))
+        conn.execute(text("CREATE INDEX ON bench_history (user_id, id)"))
+        conn.execute(text("ANALYZE bench_history"))
+        print("ilike, (user_id, id) index:", measure(conn, "ilike"))
+        print("exact, (user_id, id) index:", measure(conn, "exact"))
+        conn.execute(text("DROP TABLE bench_history"))
@@ -0,0 +1,125 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+MISSING = object()
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "sharedHits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "errors": self.errors,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class RedisBackend:
+    """Shared cache tier so every instance benefits from each other's fills.
+
+    Needs the optional `redis` package; values are stored as JSON. `errors`
+    are the exceptions a caller should treat as the tier being unavailable.
+    """
+
+    def __init__(self, url: str, prefix: str):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+        self.errors = (redis.RedisError, OSError)
+
+    async def get(self, key: str) -> Any:
+        value = await self.redis.get(self.prefix + key)
+        return MISSING if value is None else json.loads(value)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self.redis.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000))
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire after `ttl` seconds.
+
+    Values should be JSON-serialisable so they can be shared through an
+    optional backend, which is consulted on local misses. Backend failures
+    are counted and otherwise ignored, leaving the local tier to answer.
+    """
+
+    def __init__(self, max_size: int, ttl: float, backend: Optional[RedisBackend] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self.stats = CacheStats()
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_local(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def set_local(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def get(self, key: str) -> Any:
+        value = self.get_local(key)
+        if value is MISSING and self.backend is not None:
+            try:
+                value = await self.backend.get(key)
+            except self.backend.errors:
+                self.stats.errors += 1
+            if value is not MISSING:
+                self.stats.shared_hits += 1
+                self.set_local(key, value)
+        if value is MISSING:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any):
+        self.set_local(key, value)
+        if self.backend is not None:
+            try:
+                await self.backend.set(key, value, self.ttl)
+            except self.backend.errors:
+                self.stats.errors += 1
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+
+
+def create_cache(name: str, max_size: int, ttl: float, redis_url: Optional[str] = None) -> TTLCache:
+    backend = RedisBackend(redis_url, f"lutfuel:{name}:") if redis_url else None
+    return TTLCache(max_size, ttl, backend)
@@ -0,0 +1,83 @@
+import time
+from typing import Optional
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlmodel import Session, select
+
+from core.models import Car, SPBU_Data
+
+
+class Record:
+    __slots__ = ()
+
+    def __init__(self, row):
+        for name in self.__slots__:
+            setattr(self, name, getattr(row, name))
+
+    def dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class CarRecord(Record):
+    __slots__ = tuple(Car.__fields__)
+
+
+class FuelRecord(Record):
+    __slots__ = tuple(SPBU_Data.__fields__)
+
+
+def rows_md5(id_column, columns):
+    """md5 over the given columns of every row, in id order (PostgreSQL)."""
+    row = func.concat_ws(",", *columns)
+    return func.md5(func.string_agg(row, aggregate_order_by(literal_column("';'"), id_column)))
+
+
+class Catalog:
+    """In-memory copy of the Car and SPBU_Data tables, indexed by id.
+
+    Every `check_interval` seconds `refresh` compares a version query (row
+    counts and an md5 over every column of every row) against the loaded
+    copy and reloads on change; after `ttl` seconds it reloads regardless.
+    """
+
+    def __init__(self, check_interval: float = 30.0, ttl: float = 3600.0):
+        self.check_interval = check_interval
+        self.ttl = ttl
+        self.cars: dict[int, CarRecord] = {}
+        self.fuels: dict[int, FuelRecord] = {}
+        self.version: Optional[tuple] = None
+        self.generation = 0
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+
+    def car(self, car_id: int) -> Optional[CarRecord]:
+        return self.cars.get(car_id)
+
+    def fuel(self, fuel_id: int) -> Optional[FuelRecord]:
+        return self.fuels.get(fuel_id)
+
+    def refresh(self, session: Session, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        version = self._version(session)
+        if force or version != self.version or now - self._loaded_at >= self.ttl:
+            self.cars = {car.id: CarRecord(car) for car in session.exec(select(Car)).all()}
+            self.fuels = {
+                fuel.id: FuelRecord(fuel) for fuel in session.exec(select(SPBU_Data)).all()
+            }
+            self.version = version
+            self.generation += 1
+            self._loaded_at = now
+
+    def _version(self, session: Session) -> tuple:
+        cars = session.exec(
+            select(func.count(Car.id), rows_md5(Car.id, Car.__table__.columns))
+        ).one()
+        fuels = session.exec(
+            select(func.count(SPBU_Data.id), rows_md5(SPBU_Data.id, SPBU_Data.__table__.columns))
+        ).one()
+        return tuple(str(value) for value in (*cars, *fuels))
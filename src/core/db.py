@@ -1,5 +1,142 @@
+import os
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from sqlmodel import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from core.keys.secrets import DATABASE_URL
+from core.metrics import Histogram
+from core.telemetry import record_query
+
+
+def env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkout_wait_ms = Histogram()
+        self.query_ms = Histogram()
+        self.timeouts = 0
+        self.engines = {}
+
+    def snapshot(self) -> dict:
+        pools = {}
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if not isinstance(pool, QueuePool):
+                pools[name] = {"pooled": False}
+                continue
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            pools[name] = {
+                "pooled": True,
+                "size": pool.size(),
+                "checkedOut": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "saturation": pool.checkedout() / capacity if capacity else 0.0,
+            }
+        return {
+            "checkoutWaitMs": self.checkout_wait_ms.snapshot(),
+            "queryMs": self.query_ms.snapshot(),
+            "timeouts": self.timeouts,
+            "pools": pools,
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class CheckoutTimingMixin:
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.checkout_wait_ms.observe((time.perf_counter() - started) * 1000)
+
+
+# Async engines run these too, through their sync_engine; SQLAlchemy carries
+# the caller's contextvars into its greenlets, so queries land on the request.
+# A failed execute never reaches the after hook, so its start time is simply
+# overwritten by the next query on the connection.
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started", None)
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    pool_metrics.query_ms.observe(elapsed_ms)
+    record_query(elapsed_ms)
+
+
+class MeteredQueuePool(CheckoutTimingMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def async_database_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    if scheme in ("postgres", "postgresql", "postgresql+psycopg2"):
+        scheme = "postgresql+asyncpg"
+    return f"{scheme}://{rest}"
+
+
+def create_db_engine(name: str, url: str = DATABASE_URL, asynchronous: bool = False):
+    """Build an engine with the pool settings shared by every entry point.
+
+    Pool size, overflow, checkout timeout, recycle age and pre-ping come from
+    DB_* env vars. Behind PgBouncer in transaction mode (DB_PGBOUNCER=true)
+    prepared-statement caching is turned off, since statements do not
+    survive between transactions, and DB_POOL_DISABLED=true leaves pooling
+    to PgBouncer entirely.
+    """
+    options = {"pool_pre_ping": env_flag("DB_POOL_PRE_PING", True)}
+    if env_flag("DB_POOL_DISABLED", False):
+        options["poolclass"] = NullPool
+    else:
+        options.update(
+            poolclass=MeteredAsyncQueuePool if asynchronous else MeteredQueuePool,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        )
+
+    if asynchronous:
+        url = make_url(async_database_url(url))
+        if env_flag("DB_PGBOUNCER", False):
+            url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+            options["connect_args"] = {"statement_cache_size": 0}
+        engine = create_async_engine(url, **options)
+    else:
+        engine = create_engine(url, **options)
+    pool_metrics.engines[name] = engine
+    return engine
+
+
+# Sync engine for scripts and startup work (migrate.py, backfills).
+db_engine = create_db_engine("sync")
+
+async_engine = create_db_engine("async", asynchronous=True)
+async_session = async_sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 
-db_engine = create_engine(DATABASE_URL)
+async def get_session():
+    async with async_session() as session:
+        yield session
@@ -0,0 +1,256 @@
+import heapq
+import math
+import threading
+from typing import Optional
+
+import numpy as np
+from scipy.spatial import cKDTree
+from sqlmodel import Session, select
+
+from core.geocode import EARTH_RADIUS_KM, to_unit_vectors
+from core.models import History
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = (
+        np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lng1, lat2, lng2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class RoadGraph:
+    """Fastest drive over a local road network, e.g. an OSM extract.
+
+    Loaded from an .npz with node arrays `lat`, `lng` and directed edge
+    arrays `src`, `dst`, `length_km`, `speed_kmh`. Endpoints snap to the
+    nearest node within `max_snap_km`; A* searches on travel time with a
+    straight-line-at-top-speed heuristic and gives up after
+    `max_expansions` nodes so a lookup stays within milliseconds.
+    """
+
+    def __init__(
+        self,
+        lat,
+        lng,
+        src,
+        dst,
+        length_km,
+        speed_kmh,
+        max_snap_km: float = 1.0,
+        max_expansions: int = 20_000,
+    ):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        # The search loop reads these per node; plain floats beat NumPy scalars.
+        self.lat_rad = np.radians(self.lat).tolist()
+        self.lng_rad = np.radians(self.lng).tolist()
+        self.cos_lat = np.cos(np.radians(self.lat)).tolist()
+        src = np.asarray(src, dtype=np.int64)
+        order = np.argsort(src, kind="stable")
+        self.offsets = np.searchsorted(src[order], np.arange(len(self.lat) + 1))
+        self.targets = np.asarray(dst, dtype=np.int64)[order]
+        self.lengths = np.asarray(length_km, dtype=np.float64)[order]
+        speed_kmh = np.asarray(speed_kmh, dtype=np.float64)[order]
+        self.minutes = self.lengths / speed_kmh * 60
+        self.max_speed_kmh = float(speed_kmh.max()) if len(speed_kmh) else 1.0
+        self.max_snap_km = max_snap_km
+        self.max_expansions = max_expansions
+        self.tree = cKDTree(to_unit_vectors(self.lat, self.lng))
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "RoadGraph":
+        with np.load(path) as data:
+            return cls(
+                data["lat"],
+                data["lng"],
+                data["src"],
+                data["dst"],
+                data["length_km"],
+                data["speed_kmh"],
+                **kwargs,
+            )
+
+    def snap(self, lat: float, lng: float) -> Optional[tuple]:
+        chord, node = self.tree.query(to_unit_vectors([lat], [lng])[0])
+        distance_km = 2 * EARTH_RADIUS_KM * np.arcsin(min(chord / 2, 1.0))
+        if distance_km > self.max_snap_km:
+            return None
+        return int(node), float(distance_km)
+
+    def route(self, lat1: float, lng1: float, lat2: float, lng2: float) -> Optional[tuple]:
+        """(km, minutes) of the fastest path, or None when it cannot be found."""
+        start, goal = self.snap(lat1, lng1), self.snap(lat2, lng2)
+        if start is None or goal is None:
+            return None
+        (start, start_km), (goal, goal_km) = start, goal
+        found = self._search(start, goal)
+        if found is None:
+            return None
+        km, minutes = found
+        return km + start_km + goal_km, minutes
+
+    def _search(self, start: int, goal: int) -> Optional[tuple]:
+        lat_rad, lng_rad, cos_lat = self.lat_rad, self.lng_rad, self.cos_lat
+        goal_lat, goal_lng, goal_cos = lat_rad[goal], lng_rad[goal], cos_lat[goal]
+        minutes_per_radian = 2 * EARTH_RADIUS_KM * 60 / self.max_speed_kmh
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+
+        def heuristic(node: int) -> float:
+            a = (
+                sin((goal_lat - lat_rad[node]) / 2) ** 2
+                + cos_lat[node] * goal_cos * sin((goal_lng - lng_rad[node]) / 2) ** 2
+            )
+            return asin(sqrt(min(a, 1.0))) * minutes_per_radian
+
+        best = {start: (0.0, 0.0)}
+        queue = [(heuristic(start), 0.0, start)]
+        done = set()
+        while queue and len(done) < self.max_expansions:
+            _, minutes, node = heapq.heappop(queue)
+            if node == goal:
+                return best[node][1], minutes
+            if node in done:
+                continue
+            done.add(node)
+            km = best[node][1]
+            first, last = self.offsets[node], self.offsets[node + 1]
+            for target, edge_minutes, edge_km in zip(
+                self.targets[first:last].tolist(),
+                self.minutes[first:last].tolist(),
+                self.lengths[first:last].tolist(),
+            ):
+                cost = minutes + edge_minutes
+                if target not in best or cost < best[target][0]:
+                    best[target] = (cost, km + edge_km)
+                    heapq.heappush(queue, (cost + heuristic(target), cost, target))
+        return None
+
+
+class DistanceEstimator:
+    """Road distance and drive time without a network call.
+
+    Road km is the haversine distance times a circuity factor, and minutes
+    follow from a typical speed. Both are medians over observed trips in
+    the same straight-line distance band: past History rows that stored
+    their coordinates, and every route fetched from Google. Bands with
+    fewer than `min_samples` trips fall back to the all-trip median, then
+    to the defaults. With a `graph`, trips it can route use it instead.
+    Estimates run in worker threads while trips are observed on the event
+    loop, so the samples and fitted bands are guarded by a lock.
+    """
+
+    BAND_EDGES_KM = (2.0, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0)
+
+    def __init__(
+        self,
+        capacity: int = 50_000,
+        min_samples: int = 20,
+        default_circuity: float = 1.4,
+        default_speed_kmh: float = 40.0,
+        graph: Optional[RoadGraph] = None,
+    ):
+        self.capacity = capacity
+        self.min_samples = min_samples
+        self.default_circuity = default_circuity
+        self.default_speed_kmh = default_speed_kmh
+        self.graph = graph
+        self.straight_km = np.full(capacity, np.nan)
+        self.road_km = np.full(capacity, np.nan)
+        self.minutes = np.full(capacity, np.nan)
+        self.size = 0
+        self._next = 0
+        self._fitted = True
+        bands = len(self.BAND_EDGES_KM) + 1
+        self.circuity = np.full(bands, default_circuity)
+        self.speed_kmh = np.full(bands, default_speed_kmh)
+        self._lock = threading.Lock()
+
+    def observe(self, straight_km, road_km, minutes=np.nan):
+        straight_km, road_km, minutes = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(straight_km, dtype=np.float64)),
+            np.atleast_1d(np.asarray(road_km, dtype=np.float64)),
+            np.atleast_1d(np.asarray(minutes, dtype=np.float64)),
+        )
+        keep = (straight_km > 0.1) & (road_km >= straight_km)
+        straight_km, road_km, minutes = straight_km[keep], road_km[keep], minutes[keep]
+        with self._lock:
+            positions = (self._next + np.arange(len(straight_km))) % self.capacity
+            self.straight_km[positions] = straight_km
+            self.road_km[positions] = road_km
+            self.minutes[positions] = minutes
+            self._next = (self._next + len(straight_km)) % self.capacity
+            self.size = min(self.size + len(straight_km), self.capacity)
+            self._fitted = self._fitted and not len(straight_km)
+
+    def fit(self):
+        with self._lock:
+            self._fit()
+
+    def _fit(self):
+        straight_km = self.straight_km[: self.size]
+        ratio = self.road_km[: self.size] / straight_km
+        speed = self.road_km[: self.size] / self.minutes[: self.size] * 60
+        bands = np.digitize(straight_km, self.BAND_EDGES_KM)
+        overall_circuity = np.median(ratio) if len(ratio) >= self.min_samples else None
+        timed = np.isfinite(speed) & (speed > 0)
+        overall_speed = np.median(speed[timed]) if timed.sum() >= self.min_samples else None
+        for band in range(len(self.circuity)):
+            in_band = bands == band
+            if in_band.sum() >= self.min_samples:
+                self.circuity[band] = np.median(ratio[in_band])
+            else:
+                self.circuity[band] = overall_circuity or self.default_circuity
+            if (in_band & timed).sum() >= self.min_samples:
+                self.speed_kmh[band] = np.median(speed[in_band & timed])
+            else:
+                self.speed_kmh[band] = overall_speed or self.default_speed_kmh
+        self._fitted = True
+
+    def estimate(self, lat1: float, lng1: float, lat2: float, lng2: float) -> dict:
+        if self.graph is not None:
+            routed = self.graph.route(lat1, lng1, lat2, lng2)
+            if routed is not None:
+                return {"distance": routed[0], "duration": routed[1], "source": "graph"}
+        straight_km = float(haversine_km(lat1, lng1, lat2, lng2))
+        band = int(np.digitize(straight_km, self.BAND_EDGES_KM))
+        with self._lock:
+            if not self._fitted:
+                self._fit()
+            circuity, speed_kmh = self.circuity[band], self.speed_kmh[band]
+        distance = straight_km * circuity
+        return {
+            "distance": float(distance),
+            "duration": float(distance / speed_kmh * 60),
+            "source": "circuity",
+        }
+
+    def load_history(self, session: Session):
+        rows = session.exec(
+            select(
+                History.from_lat,
+                History.from_lng,
+                History.destination_lat,
+                History.destination_lng,
+                History.distance,
+            )
+            .where(History.from_lat.is_not(None), History.destination_lat.is_not(None))
+            .order_by(History.id.desc())
+            .limit(self.capacity)
+        ).all()
+        if rows:
+            lat1, lng1, lat2, lng2, distance = np.array(rows, dtype=np.float64).T
+            self.observe(haversine_km(lat1, lng1, lat2, lng2), distance)
+        self.fit()
+
+    def snapshot(self) -> dict:
+        return {
+            "samples": self.size,
+            "graph": self.graph is not None,
+            "bandEdgesKm": list(self.BAND_EDGES_KM),
+            "circuity": [round(float(value), 3) for value in self.circuity],
+            "speedKmh": [round(float(value), 1) for value in self.speed_kmh],
+        }
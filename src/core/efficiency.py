@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+import joblib
+import numpy as np
+from sqlalchemy import delete, exc, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.catalog import rows_md5
+from core.features import CAR_FEATURES, feature_matrix
+from core.model import load_model
+from core.models import Car, CarEfficiency, SPBU_Data
+
+
+def file_signature(path: str) -> tuple:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class EfficiencyTable:
+    """Predicted km/l for every (car, fuel grade) pair.
+
+    The table is fingerprinted by the model and scaler file contents plus an
+    md5 over every car's feature values and the set of fuel grades.
+    `refresh` recomputes that fingerprint at most every `check_interval`
+    seconds and rebuilds the table in one batched forward pass when it no
+    longer matches; file hashing, model loading and the forward pass run in
+    a worker thread. With a `persist_session` factory the rows are also
+    upserted into `CarEfficiency` in a session of their own, so a new
+    instance running the same model can load them instead of recomputing.
+    A failed write only costs that reuse, never the request.
+    """
+
+    def __init__(
+        self,
+        predictor,
+        model_path: str,
+        scaler_path: str,
+        persist_session=None,
+        check_interval: float = 60.0,
+    ):
+        self.predictor = predictor
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.persist_session = persist_session
+        self.persist_errors = 0
+        self.check_interval = check_interval
+        self.car_index: dict[int, int] = {}
+        self.grade_index: dict[int, int] = {}
+        self.values = np.empty((0, 0))
+        self.fingerprint: Optional[str] = None
+        self._checked_at = 0.0
+        self._files: Optional[dict] = None
+
+    def lookup(self, car_id: int, fuel_grade: int) -> Optional[float]:
+        row = self.car_index.get(car_id)
+        col = self.grade_index.get(fuel_grade)
+        if row is None or col is None or np.isnan(self.values[row, col]):
+            return None
+        return float(self.values[row, col])
+
+    def matrix(self, car_ids: list, grades: list) -> np.ndarray:
+        """km/l for every car_ids x grades pair, NaN where the table has none."""
+        values = np.full((len(car_ids), len(grades)), np.nan)
+        rows = np.array([self.car_index.get(car_id, -1) for car_id in car_ids], dtype=np.int64)
+        cols = np.array([self.grade_index.get(grade, -1) for grade in grades], dtype=np.int64)
+        known_rows, known_cols = rows >= 0, cols >= 0
+        values[np.ix_(known_rows, known_cols)] = self.values[
+            np.ix_(rows[known_rows], cols[known_cols])
+        ]
+        return values
+
+    async def refresh(self, session: AsyncSession, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        files = await asyncio.to_thread(self._file_state, self._files)
+        if self._files is not None and files != self._files:
+            model, scaler = await asyncio.gather(
+                asyncio.to_thread(load_model, self.model_path),
+                asyncio.to_thread(joblib.load, self.scaler_path),
+            )
+            self.predictor.model = model
+            self.predictor.preprocess = scaler.transform
+        self._files = files
+
+        fingerprint = await session.run_sync(self._fingerprint)
+        if fingerprint == self.fingerprint:
+            return
+        if self.persist_session is not None:
+            if await session.run_sync(self._load_persisted, fingerprint):
+                return
+        await self._rebuild(session, fingerprint)
+
+    def _file_state(self, previous: Optional[dict] = None) -> dict:
+        state = {}
+        for path in (self.model_path, self.scaler_path):
+            signature = file_signature(path)
+            if previous and previous[path][0] == signature:
+                state[path] = previous[path]
+            else:
+                state[path] = (signature, file_digest(path))
+        return state
+
+    def _fingerprint(self, session: Session) -> str:
+        features = [Car.id, *(getattr(Car, name) for name in CAR_FEATURES)]
+        cars = session.exec(select(func.count(Car.id), rows_md5(Car.id, features))).one()
+        grades = session.exec(
+            select(SPBU_Data.fuel_grade).distinct().order_by(SPBU_Data.fuel_grade)
+        ).all()
+        payload = {
+            "files": [digest for _, digest in self._files.values()],
+            "cars": [str(value) for value in cars],
+            "grades": list(grades),
+        }
+        return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+    async def _rebuild(self, session: AsyncSession, fingerprint: str):
+        cars = (await session.exec(select(Car).order_by(Car.id))).all()
+        grades = (
+            await session.exec(
+                select(SPBU_Data.fuel_grade).distinct().order_by(SPBU_Data.fuel_grade)
+            )
+        ).all()
+        if cars and grades:
+            values = await asyncio.to_thread(
+                lambda: self.predictor.forward(feature_matrix(cars, grades))
+            )
+        else:
+            values = np.empty(0)
+        self._set(
+            [car.id for car in cars], list(grades), values.reshape(len(cars), len(grades)), fingerprint
+        )
+
+        if self.persist_session is not None:
+            try:
+                async with self.persist_session() as persist:
+                    await persist.run_sync(self._persist, fingerprint)
+            except exc.DBAPIError:
+                self.persist_errors += 1
+
+    def _persist(self, session: Session, fingerprint: str):
+        # Upserts keep concurrent instances from colliding on the primary key;
+        # rows left by another fingerprint are cleared afterwards.
+        statement = insert(CarEfficiency)
+        statement = statement.on_conflict_do_update(
+            index_elements=[CarEfficiency.car_id, CarEfficiency.fuel_grade],
+            set_={
+                "km_per_liter": statement.excluded.km_per_liter,
+                "fingerprint": statement.excluded.fingerprint,
+            },
+        )
+        rows = [
+            {
+                "car_id": car_id,
+                "fuel_grade": grade,
+                "km_per_liter": float(self.values[row, col]),
+                "fingerprint": fingerprint,
+            }
+            for car_id, row in self.car_index.items()
+            for grade, col in self.grade_index.items()
+        ]
+        if rows:
+            session.execute(statement, rows)
+        session.exec(delete(CarEfficiency).where(CarEfficiency.fingerprint != fingerprint))
+        session.commit()
+
+    def _load_persisted(self, session: Session, fingerprint: str) -> bool:
+        rows = session.exec(
+            select(CarEfficiency).where(CarEfficiency.fingerprint == fingerprint)
+        ).all()
+        if not rows:
+            return False
+        car_ids = sorted({row.car_id for row in rows})
+        grades = sorted({row.fuel_grade for row in rows})
+        values = np.full((len(car_ids), len(grades)), np.nan)
+        car_index = {car_id: i for i, car_id in enumerate(car_ids)}
+        grade_index = {grade: i for i, grade in enumerate(grades)}
+        for row in rows:
+            values[car_index[row.car_id], grade_index[row.fuel_grade]] = row.km_per_liter
+        self._set(car_ids, grades, values, fingerprint)
+        return True
+
+    def _set(self, car_ids: list, grades: list, values: np.ndarray, fingerprint: str):
+        self.car_index = {car_id: i for i, car_id in enumerate(car_ids)}
+        self.grade_index = {grade: i for i, grade in enumerate(grades)}
+        self.values = values
+        self.fingerprint = fingerprint
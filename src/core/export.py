@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Callable
+
+from sqlmodel import select
+
+from core.models import Car, History, SPBU_Data
+
+
+EXPORT_COLUMNS = {
+    "id": History.id,
+    "carName": Car.car_name,
+    "carCustomName": History.car_custom_name,
+    "fuelType": SPBU_Data.fuel_type,
+    "distance": History.distance,
+    "from": History.from_location,
+    "destination": History.destination,
+    "tolls": History.tolls,
+    "fuelNeeded": History.fuel_needed,
+    "fuelCost": History.fuel_cost,
+    "tollCost": History.toll_cost,
+}
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def history_export_query(user_id: str):
+    return (
+        select(*EXPORT_COLUMNS.values())
+        .select_from(History)
+        .outerjoin(Car, Car.id == History.car_id)
+        .outerjoin(SPBU_Data, SPBU_Data.id == History.fuel_id)
+        .where(History.user_id == user_id)
+        .order_by(History.id)
+    )
+
+
+def csv_chunk(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def ndjson_chunk(rows) -> str:
+    return "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows)
+
+
+async def stream_history(
+    session_factory: Callable, user_id: str, format: str, chunk_size: int = 1000
+) -> AsyncIterator[str]:
+    """Yield a user's history as CSV or NDJSON text, one chunk per fetch.
+
+    Rows come through a server-side cursor `chunk_size` at a time, so memory
+    stays flat however many rows the user has. The generator owns its own
+    session because it outlives the request handler.
+    """
+    if format == "csv":
+        yield csv_chunk((), header=True)
+    async with session_factory() as session:
+        result = await session.stream(
+            history_export_query(user_id).execution_options(yield_per=chunk_size)
+        )
+        async for rows in result.partitions():
+            yield csv_chunk(rows) if format == "csv" else ndjson_chunk(rows)
@@ -0,0 +1,27 @@
+import numpy as np
+
+
+CAR_FEATURES = (
+    "number_of_cylinders",
+    "engine_type",
+    "engine_horse_power",
+    "engine_horse_power_rpm",
+    "transmission",
+    "fuel_tank_capacity",
+    "acceleration_0_to_100_km",
+)
+
+
+def feature_matrix(cars, fuel_grades) -> np.ndarray:
+    """Rows for every (car, fuel grade) pair, car-major: row i * len(fuel_grades) + j."""
+    car_part = np.array(
+        [[getattr(car, name) for name in CAR_FEATURES] for car in cars], dtype=np.float64
+    ).reshape(len(cars), len(CAR_FEATURES))
+    grades = np.asarray(fuel_grades, dtype=np.float64)
+    return np.column_stack(
+        [np.repeat(car_part, len(grades), axis=0), np.tile(grades, len(cars))]
+    )
+
+
+def car_features(car, fuel_grade: int) -> np.ndarray:
+    return feature_matrix([car], [fuel_grade])[0]
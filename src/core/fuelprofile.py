@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+
+from core.distance import haversine_km
+from core.polyline import decode
+
+
+# Relative consumption per km at speed v is IDLE_KMH / v + 1 + DRAG * v**2:
+# stop-and-go dominates at low speed, drag at high speed. It is normalised
+# to 1 at REFERENCE_KMH, the mixed driving the model's km/l stands for.
+IDLE_KMH = 20.0
+DRAG = 3e-5
+REFERENCE_KMH = float(os.getenv("FUEL_PROFILE_REFERENCE_KMH", "50"))
+TOLL_FACTOR = float(os.getenv("FUEL_PROFILE_TOLL_FACTOR", "0.95"))
+MIN_SPEED_KMH, MAX_SPEED_KMH = 5.0, 130.0
+
+
+def speed_factor(speed_kmh) -> np.ndarray:
+    speed = np.clip(np.asarray(speed_kmh, dtype=np.float64), MIN_SPEED_KMH, MAX_SPEED_KMH)
+    reference = IDLE_KMH / REFERENCE_KMH + 1 + DRAG * REFERENCE_KMH**2
+    return (IDLE_KMH / speed + 1 + DRAG * speed**2) / reference
+
+
+def route_segments(route) -> tuple:
+    """Per-segment length (km), speed (km/h) and toll flag for a RouteResult.
+
+    Segments come from each step's polyline, scaled so they add up to the
+    step's own distance and all driven at the step's average speed. Routes
+    cached before steps were kept fall back to the overview polyline at the
+    route's average speed, or to one segment when there is no polyline.
+    """
+    steps = route.steps
+    if not steps:
+        speed = route.distance / route.duration * 60 if route.duration else REFERENCE_KMH
+        points = decode(route.polyline[0]) if route.polyline else np.empty((0, 2))
+        if len(points) < 2:
+            return np.array([route.distance]), np.array([speed]), np.array([False])
+        lengths = haversine_km(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+        if lengths.sum() > 0:
+            lengths *= route.distance / lengths.sum()
+        return lengths, np.full(len(lengths), speed), np.zeros(len(lengths), dtype=bool)
+
+    decoded = [decode(step.polyline) for step in steps]
+    step_ids = np.repeat(np.arange(len(steps)), [len(points) for points in decoded])
+    points = np.concatenate(decoded) if decoded else np.empty((0, 2))
+    same_step = step_ids[1:] == step_ids[:-1]
+    step_ids = step_ids[1:][same_step]
+    lengths = haversine_km(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+    lengths = lengths[same_step]
+
+    step_km = np.array([step.distance for step in steps], dtype=np.float64) / 1000
+    step_hours = np.array([step.duration for step in steps], dtype=np.float64) / 3600
+    drawn_km = np.bincount(step_ids, weights=lengths, minlength=len(steps))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(drawn_km > 0, step_km / drawn_km, 0.0)
+        step_speed = np.where(step_hours > 0, step_km / step_hours, REFERENCE_KMH)
+    lengths = lengths * scale[step_ids]
+
+    # Steps too short to draw a segment still count, as one segment each.
+    undrawn = np.flatnonzero((drawn_km == 0) & (step_km > 0))
+    step_ids = np.concatenate([step_ids, undrawn])
+    lengths = np.concatenate([lengths, step_km[undrawn]])
+    order = np.argsort(step_ids, kind="stable")
+    step_ids, lengths = step_ids[order], lengths[order]
+    tolls = np.array([step.toll for step in steps], dtype=bool)
+    return lengths, step_speed[step_ids], tolls[step_ids]
+
+
+def fuel_profile(
+    lengths_km: np.ndarray,
+    speeds_kmh: np.ndarray,
+    tolls: np.ndarray,
+    km_per_liter: float,
+    fuel_price: float,
+    bins: int = 20,
+) -> dict:
+    """Fuel and cost per segment, totalled and binned by distance along the route."""
+    factors = speed_factor(speeds_kmh) * np.where(tolls, TOLL_FACTOR, 1.0)
+    liters = lengths_km / km_per_liter * factors
+    total_km = float(lengths_km.sum())
+
+    bins = max(1, min(bins, len(lengths_km)))
+    midpoints = np.cumsum(lengths_km) - lengths_km / 2
+    if total_km:
+        index = np.minimum((midpoints / total_km * bins).astype(np.int64), bins - 1)
+    else:
+        index = np.zeros(len(lengths_km), dtype=np.int64)
+    bin_km = np.bincount(index, weights=lengths_km, minlength=bins)
+    bin_liters = np.bincount(index, weights=liters, minlength=bins)
+    hours = lengths_km / np.maximum(speeds_kmh, MIN_SPEED_KMH)
+    bin_hours = np.bincount(index, weights=hours, minlength=bins)
+    bin_toll_km = np.bincount(index, weights=lengths_km * tolls, minlength=bins)
+    edges = np.linspace(0.0, total_km, bins + 1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speeds = np.where(bin_hours > 0, bin_km / bin_hours, 0.0)
+        toll_share = np.where(bin_km > 0, bin_toll_km / bin_km, 0.0)
+    return {
+        "segments": len(lengths_km),
+        "distance": total_km,
+        "fuelNeeded": float(liters.sum()),
+        "fuelCost": float(liters.sum() * fuel_price),
+        "tollDistance": float(lengths_km[tolls].sum()),
+        "profile": [
+            {
+                "fromKm": round(float(edges[i]), 3),
+                "toKm": round(float(edges[i + 1]), 3),
+                "fuelNeeded": float(bin_liters[i]),
+                "fuelCost": float(bin_liters[i] * fuel_price),
+                "averageSpeed": float(speeds[i]),
+                "tollShare": float(toll_share[i]),
+            }
+            for i in range(bins)
+        ],
+    }
@@ -0,0 +1,79 @@
+import csv
+import json
+from typing import Optional
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def to_unit_vectors(lats, lngs) -> np.ndarray:
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lngs = np.radians(np.asarray(lngs, dtype=np.float64))
+    return np.column_stack(
+        [np.cos(lats) * np.cos(lngs), np.cos(lats) * np.sin(lngs), np.sin(lats)]
+    )
+
+
+class ReverseGeocoder:
+    """Nearest named place from a local dataset, without a network call.
+
+    Places are indexed as points on the unit sphere in a KD-tree, so the
+    Euclidean nearest neighbour is also the great-circle nearest one.
+    Lookups further than `max_distance_km` from every place are misses.
+    """
+
+    def __init__(self, names: list[str], lats, lngs, max_distance_km: float = 2.0):
+        self.names = names
+        self.max_distance_km = max_distance_km
+        self.tree = cKDTree(to_unit_vectors(lats, lngs))
+
+    @classmethod
+    def load(cls, path: str, max_distance_km: float = 2.0) -> "ReverseGeocoder":
+        if path.endswith((".json", ".geojson")):
+            names, lats, lngs = cls._read_geojson(path)
+        else:
+            names, lats, lngs = cls._read_csv(path)
+        return cls(names, lats, lngs, max_distance_km)
+
+    def nearest(self, lat: float, lng: float) -> Optional[str]:
+        chord, index = self.tree.query(to_unit_vectors([lat], [lng])[0])
+        distance_km = 2 * EARTH_RADIUS_KM * np.arcsin(min(chord / 2, 1.0))
+        if distance_km > self.max_distance_km:
+            return None
+        return self.names[index]
+
+    @staticmethod
+    def _read_csv(path: str):
+        names, lats, lngs = [], [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                names.append(row["name"])
+                lats.append(float(row["latitude"]))
+                lngs.append(float(row["longitude"]))
+        return names, lats, lngs
+
+    @staticmethod
+    def _read_geojson(path: str):
+        names, lats, lngs = [], [], []
+        with open(path, encoding="utf-8") as f:
+            features = json.load(f)["features"]
+        for feature in features:
+            geometry = feature.get("geometry") or {}
+            coordinates = geometry.get("coordinates")
+            if geometry.get("type") == "Point":
+                lng, lat = coordinates[:2]
+            elif geometry.get("type") == "Polygon":
+                lng, lat = np.mean(coordinates[0], axis=0)[:2]
+            elif geometry.get("type") == "MultiPolygon":
+                lng, lat = np.mean(np.concatenate([polygon[0] for polygon in coordinates]), axis=0)[:2]
+            else:
+                continue
+            name = (feature.get("properties") or {}).get("name")
+            if name:
+                names.append(name)
+                lats.append(float(lat))
+                lngs.append(float(lng))
+        return names, lats, lngs
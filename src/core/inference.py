@@ -0,0 +1,140 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+from core.metrics import Histogram
+from core.telemetry import current_request, timed
+
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class InferenceMetrics:
+    def __init__(self):
+        self.batches = 0
+        self.requests = 0
+        self.errors = 0
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram()
+        self.forward_ms = Histogram()
+
+    def snapshot(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "errors": self.errors,
+            "batchSize": self.batch_size.snapshot(),
+            "queueWaitMs": self.queue_wait_ms.snapshot(),
+            "forwardMs": self.forward_ms.snapshot(),
+        }
+
+
+class BatchedPredictor:
+    """Collects concurrent single-row predictions into one forward pass.
+
+    Callers await `predict(row)`; a background worker takes the first queued
+    row, keeps collecting until `max_batch_size` rows are queued or
+    `max_wait_ms` has passed, then runs the model once on the stacked batch.
+    A failed batch fails its callers, and closing fails every pending one.
+    """
+
+    def __init__(
+        self,
+        model,
+        preprocess: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        self.model = model
+        self.preprocess = preprocess
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.metrics = InferenceMetrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def predict(self, row) -> float:
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        with timed("model"):
+            await self._queue.put((np.asarray(row, dtype=np.float64), future, time.perf_counter()))
+            return await future
+
+    def forward(self, inputs: np.ndarray) -> np.ndarray:
+        with timed("model"):
+            if self.preprocess is not None:
+                inputs = self.preprocess(inputs)
+            outputs = self.model.predict(inputs, verbose=0)
+            return np.asarray(outputs).reshape(len(inputs), -1)[:, 0]
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def _collect(self, batch: list):
+        batch.append(await self._queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        # The worker serves every request, so it must not charge its forward
+        # passes to the one whose predict() happened to start it.
+        current_request.set(None)
+        batch = []
+        try:
+            while True:
+                batch = []
+                await self._collect(batch)
+                started = time.perf_counter()
+                for _, _, queued_at in batch:
+                    self.metrics.queue_wait_ms.observe((started - queued_at) * 1000)
+
+                try:
+                    inputs = np.stack([row for row, _, _ in batch])
+                    outputs = await asyncio.to_thread(self.forward, inputs)
+                except Exception as e:
+                    self.metrics.errors += 1
+                    self._fail(batch, e)
+                    continue
+                finally:
+                    self.metrics.batches += 1
+                    self.metrics.requests += len(batch)
+                    self.metrics.batch_size.observe(len(batch))
+                    self.metrics.forward_ms.observe((time.perf_counter() - started) * 1000)
+
+                for (_, future, _), output in zip(batch, outputs):
+                    if not future.done():
+                        future.set_result(float(output))
+        finally:
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self._fail(batch, RuntimeError("predictor closed"))
+
+    @staticmethod
+    def _fail(batch: list, error: Exception):
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
@@ -0,0 +1,76 @@
+import json
+import os
+
+import numpy as np
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "tanh": np.tanh,
+}
+
+
+class NumpyDenseModel:
+    """Forward pass of a Keras Sequential stack of Dense layers in plain NumPy.
+
+    Only the layers the fuel-efficiency regressor uses are supported; loading
+    any other layer type raises so a retrained model never silently diverges
+    from the Keras backend.
+    """
+
+    def __init__(self, layers: list):
+        self.layers = layers
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyDenseModel":
+        import h5py
+
+        with h5py.File(path, "r") as f:
+            config = f.attrs["model_config"]
+            if isinstance(config, bytes):
+                config = config.decode("utf-8")
+            config = json.loads(config)
+            weights = f["model_weights"] if "model_weights" in f else f
+
+            layers = []
+            for layer in config["config"]["layers"]:
+                if layer["class_name"] in ("InputLayer", "Dropout"):
+                    continue
+                if layer["class_name"] != "Dense":
+                    raise ValueError(f"Unsupported layer type: {layer['class_name']}")
+                layer_config = layer["config"]
+                activation = layer_config.get("activation", "linear")
+                if activation not in ACTIVATIONS:
+                    raise ValueError(f"Unsupported activation: {activation}")
+
+                group = weights[layer_config["name"]]
+                names = [
+                    name.decode("utf-8") if isinstance(name, bytes) else name
+                    for name in group.attrs["weight_names"]
+                ]
+                kernel = np.asarray(group[names[0]], dtype=np.float32)
+                if layer_config.get("use_bias", True):
+                    bias = np.asarray(group[names[1]], dtype=np.float32)
+                else:
+                    bias = np.zeros(kernel.shape[1], dtype=np.float32)
+                layers.append((kernel, bias, ACTIVATIONS[activation]))
+        return cls(layers)
+
+    def predict(self, inputs, verbose=0) -> np.ndarray:
+        x = np.asarray(inputs, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return x
+
+
+def load_model(path: str, backend: str = None):
+    backend = backend or os.getenv("MODEL_BACKEND", "keras")
+    if backend == "numpy":
+        return NumpyDenseModel.load(path)
+    if backend == "keras":
+        import tensorflow as tf
+
+        return tf.keras.models.load_model(path)
+    raise ValueError(f"Unknown model backend: {backend}")
@@ -0,0 +1,83 @@
+from sqlalchemy import Index
+from sqlmodel import SQLModel, Field, Relationship
+from typing import Optional
+
+
+class CarOwnership(SQLModel, table=True):
+    __table_args__ = (Index("ix_carownership_user_id_id", "user_id", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str
+    car_id: int = Field(foreign_key="car.id")
+    custom_name: str
+    fuel_grade: int = Field(foreign_key="spbu_data.id")
+
+    car: Optional["Car"] = Relationship()
+    fuel: Optional["SPBU_Data"] = Relationship()
+
+
+class History(SQLModel, table=True):
+    __table_args__ = (Index("ix_history_user_id_id", "user_id", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str
+    car_id: int = Field(foreign_key="car.id")
+    fuel_id: int = Field(foreign_key="spbu_data.id")
+    car_custom_name: Optional[str] = None
+    fuel_needed: float
+    distance: float
+    # from_location: str = Field(alias="from")
+    from_location: str
+    destination: str
+    tolls: bool
+    fuel_cost: float
+    toll_cost: float
+    from_lat: Optional[float] = None
+    from_lng: Optional[float] = None
+    destination_lat: Optional[float] = None
+    destination_lng: Optional[float] = None
+
+    car: Optional["Car"] = Relationship()
+    fuel: Optional["SPBU_Data"] = Relationship()
+
+
+class Car(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    maker: str
+    model: str
+    number_of_cylinders: int
+    engine_type: int
+    engine_horse_power: float
+    engine_horse_power_rpm: int
+    transmission: int
+    fuel_tank_capacity: int
+    acceleration_0_to_100_km: float
+    max_speed_km_per_hour: int
+    fuel_grade: int
+    year: int
+    type_of_car: int
+    car_name: str
+
+
+class SPBU_Data(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    gas_station: str
+    fuel_type: str
+    fuel_grade: int
+    fuel_price: int
+
+
+class CarEfficiency(SQLModel, table=True):
+    car_id: int = Field(primary_key=True)
+    fuel_grade: int = Field(primary_key=True)
+    km_per_liter: float
+    fingerprint: str
+
+
+class UserStats(SQLModel, table=True):
+    user_id: str = Field(primary_key=True)
+    total_distance: float = 0
+    total_fuel: float = 0
+    total_fuel_cost: float = 0
+    total_toll_cost: float = 0
+    trip_count: int = 0
@@ -0,0 +1,47 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def decode_offset(cursor: str) -> int:
+    """The single non-negative int in a cursor: a rank offset or the last id seen."""
+    values = decode_cursor(cursor)
+    if len(values) != 1 or type(values[0]) is not int or values[0] < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values[0]
+
+
+def paginate(query, column, page: int, size: int, cursor: Optional[str] = None):
+    """Order `query` by `column` and apply either the cursor or page/size window.
+
+    With a cursor the query seeks past the last seen key, so deep pages cost
+    the same as the first one; without it the old offset behaviour is kept.
+    """
+    if cursor:
+        query = query.where(column > decode_offset(cursor))
+    else:
+        query = query.offset(page * size)
+    return query.order_by(column).limit(size)
+
+
+def next_cursor(rows: list, size: int) -> Optional[str]:
+    if size <= 0 or len(rows) < size:
+        return None
+    return encode_cursor(rows[-1].id)
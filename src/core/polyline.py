@@ -0,0 +1,95 @@
+import base64
+
+import numpy as np
+
+from core.geocode import EARTH_RADIUS_KM
+
+
+PRECISION = 1e5
+ENCODINGS = ("google", "simplified", "binary")
+
+
+def decode(polyline: str) -> np.ndarray:
+    """(n, 2) array of (lat, lng) from a Google encoded polyline string."""
+    data = np.frombuffer(polyline.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if not len(data):
+        return np.empty((0, 2))
+    ends = np.flatnonzero((data & 0x20) == 0)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat((data & 0x1F) << (5 * position), starts)
+    deltas = (values >> 1) ^ -(values & 1)
+    return np.cumsum(deltas[: len(deltas) // 2 * 2].reshape(-1, 2), axis=0) / PRECISION
+
+
+def encode(points) -> str:
+    """Google encoded polyline string for an (n, 2) array of (lat, lng)."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(points):
+        return ""
+    scaled = np.round(points * PRECISION).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=0).ravel()
+    values = (deltas << 1) ^ (deltas >> 63)
+    chunks = 1 + sum((values >= 1 << (5 * i)).astype(np.int64) for i in range(1, 7))
+    starts = np.cumsum(chunks) - chunks
+    position = np.arange(chunks.sum()) - np.repeat(starts, chunks)
+    data = (np.repeat(values, chunks) >> (5 * position)) & 0x1F
+    data |= np.where(position < np.repeat(chunks, chunks) - 1, 0x20, 0)
+    return (data + 63).astype(np.uint8).tobytes().decode("ascii")
+
+
+def simplify(points, tolerance_m: float) -> np.ndarray:
+    """Douglas-Peucker: drop points within `tolerance_m` metres of the kept line."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) < 3 or tolerance_m <= 0:
+        return points
+    # Equirectangular projection to metres is exact enough at route scale.
+    scale = EARTH_RADIUS_KM * 1000 * np.pi / 180
+    xy = np.column_stack(
+        [points[:, 1] * np.cos(np.radians(points[:, 0].mean())), points[:, 0]]
+    ) * scale
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, segment = xy[first], xy[last] - xy[first]
+        inner = xy[first + 1 : last] - start
+        length = segment @ segment
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            t = np.clip(inner @ segment / length, 0.0, 1.0)
+            offset = inner - np.outer(t, segment)
+            distances = np.hypot(offset[:, 0], offset[:, 1])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return points[keep]
+
+
+def to_binary(points) -> str:
+    """Base64 of little-endian int32: the first point in 1e-5 degrees, then deltas."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    scaled = np.round(points * PRECISION).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=0)
+    return base64.b64encode(deltas.astype("<i4").tobytes()).decode("ascii")
+
+
+def from_binary(payload: str) -> np.ndarray:
+    deltas = np.frombuffer(base64.b64decode(payload), dtype="<i4").astype(np.int64)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / PRECISION
+
+
+def transcode(polyline: str, encoding: str, tolerance_m: float = 5.0) -> str:
+    if encoding == "google":
+        return polyline
+    points = decode(polyline)
+    if encoding == "simplified":
+        return encode(simplify(points, tolerance_m))
+    return to_binary(points)
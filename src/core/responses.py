@@ -0,0 +1,124 @@
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from core.cache import MISSING, TTLCache
+
+
+class UserVersions:
+    """Per-user data versions; every write to a user's data bumps theirs.
+
+    Versions are drawn from one counter, and a user with no stored version
+    reads the counter's current value. No response can be cached under that
+    value for them unless it was their own latest bump, so dropping entries
+    (LRU or Redis expiry) never resurrects stale data. With `redis_url` the
+    versions are shared by every instance.
+    """
+
+    def __init__(self, max_size: int = 100_000, redis_url: Optional[str] = None):
+        self.max_size = max_size
+        self.counter = 0
+        self._versions: OrderedDict = OrderedDict()
+        self.redis = None
+        self.errors: tuple = ()
+        if redis_url:
+            import redis.asyncio as redis
+
+            self.redis = redis.from_url(redis_url)
+            self.errors = (redis.RedisError, OSError)
+
+    async def get(self, user_id: str) -> int:
+        if self.redis is not None:
+            version = await self.redis.get(f"lutfuel:versions:{user_id}")
+            if version is None:
+                version = await self.redis.get("lutfuel:versions")
+            return int(version or 0)
+        if user_id in self._versions:
+            self._versions.move_to_end(user_id)
+            return self._versions[user_id]
+        return self.counter
+
+    async def bump(self, user_id: str):
+        if self.redis is not None:
+            version = await self.redis.incr("lutfuel:versions")
+            await self.redis.set(f"lutfuel:versions:{user_id}", version)
+            return
+        self.counter += 1
+        self._versions[user_id] = self.counter
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.max_size:
+            self._versions.popitem(last=False)
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+class UserResponseCache:
+    """Cached GET responses per user, keyed by the user's data version.
+
+    A response is stored under (user, version, path and query), and its ETag
+    is derived from the same key. A request whose If-None-Match carries the
+    current ETag gets a 304 after only the version lookup; any other request
+    is served from the cache or built once per version. Without `versions`
+    every response is built fresh and carries no ETag: versions kept per
+    process would miss other instances' writes. The same goes for a request
+    whose version cannot be read from Redis.
+    """
+
+    def __init__(self, versions: Optional[UserVersions], cache: TTLCache):
+        self.versions = versions
+        self.cache = cache
+        self.not_modified = 0
+        self.bumps = 0
+        self.errors = 0
+
+    async def respond(
+        self, request: Request, user_id: str, build: Callable[[], Awaitable[dict]]
+    ) -> Response:
+        if self.versions is None:
+            return JSONResponse(jsonable_encoder(await build()))
+        try:
+            version = await self.versions.get(user_id)
+        except self.versions.errors:
+            self.errors += 1
+            return JSONResponse(jsonable_encoder(await build()))
+        key = f"{user_id}:{version}:{request.url.path}?{request.url.query}"
+        etag = f'"{version}-{hashlib.sha256(key.encode()).hexdigest()[:16]}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if etag in request.headers.get("if-none-match", ""):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        body = await self.cache.get(key)
+        if body is MISSING:
+            body = jsonable_encoder(await build())
+            await self.cache.set(key, body)
+        return JSONResponse(body, headers=headers)
+
+    async def invalidate(self, user_id: str):
+        if self.versions is None:
+            return
+        self.bumps += 1
+        try:
+            await self.versions.bump(user_id)
+        except self.versions.errors:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.versions is not None,
+            **self.cache.stats.snapshot(),
+            "notModified": self.not_modified,
+            "invalidations": self.bumps,
+            "versionErrors": self.errors,
+        }
+
+    async def close(self):
+        if self.versions is not None:
+            await self.versions.close()
+        await self.cache.close()
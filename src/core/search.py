@@ -0,0 +1,87 @@
+import re
+from collections import defaultdict
+from typing import Optional
+
+import numpy as np
+
+
+def normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text.lower()).split())
+
+
+def trigrams(text: str) -> set[str]:
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class CarSearchIndex:
+    """Ranked, typo-tolerant search over car name, maker and model.
+
+    Documents are indexed by word trigrams (the same scheme as pg_trgm).
+    A query scores every document sharing a trigram with it by trigram
+    similarity, plus a boost for containing the query as a substring or for
+    words starting with the query's words. Every candidate is boosted, so
+    the ranking does not depend on which page is asked for.
+    """
+
+    MIN_SIMILARITY = 0.15
+
+    def __init__(self, cars):
+        self.ids = np.array([car.id for car in cars], dtype=np.int64)
+        self.texts = [normalize(f"{car.car_name} {car.maker} {car.model}") for car in cars]
+        postings = defaultdict(list)
+        sizes = np.zeros(len(cars), dtype=np.float64)
+        for position, text in enumerate(self.texts):
+            grams = trigrams(text)
+            sizes[position] = len(grams)
+            for gram in grams:
+                postings[gram].append(position)
+        self.sizes = sizes
+        self.postings = {gram: np.array(docs, dtype=np.int32) for gram, docs in postings.items()}
+        self.id_order = np.argsort(self.ids, kind="stable")
+
+    def search(self, query: str, offset: int, limit: int) -> list[int]:
+        query = normalize(query)
+        if not query:
+            return self.ids[self.id_order[offset : offset + limit]].tolist()
+
+        grams = trigrams(query)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return []
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.ids))
+        candidates = np.flatnonzero(shared)
+        scores = shared[candidates] / (len(grams) + self.sizes[candidates] - shared[candidates])
+
+        words = query.split()
+        ranked = []
+        for position, score in zip(candidates.tolist(), scores.tolist()):
+            text = self.texts[position]
+            if query in text:
+                score += 1.0
+            text_words = text.split()
+            prefixed = sum(
+                any(word.startswith(token) for word in text_words) for token in words
+            )
+            score += 0.25 * prefixed / len(words)
+            if score >= self.MIN_SIMILARITY:
+                ranked.append((-score, self.ids[position]))
+        ranked.sort()
+        return [int(car_id) for _, car_id in ranked[offset : offset + limit]]
+
+
+class CarSearch:
+    """Keeps a CarSearchIndex in step with the catalog it was built from."""
+
+    def __init__(self):
+        self.index: Optional[CarSearchIndex] = None
+        self.generation = None
+
+    def search(self, catalog, query: str, offset: int, limit: int) -> list[int]:
+        if self.index is None or self.generation != catalog.generation:
+            self.index = CarSearchIndex(list(catalog.cars.values()))
+            self.generation = catalog.generation
+        return self.index.search(query, offset, limit)
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+
+class Startup:
+    """Warm-up steps run concurrently in the background after the app starts.
+
+    Steps are registered with `step` and may depend on each other by name.
+    The server accepts requests immediately; handlers that need a resource
+    `await startup.wait(name)` and readiness flips once every step is done.
+    A failed step (or one whose dependency failed) is retried with
+    exponential backoff, in the background and on the next `wait` once the
+    backoff has passed; until then `wait` re-raises the last error.
+    """
+
+    def __init__(self, retry_initial: float = 1.0, retry_max: float = 60.0):
+        self.steps: dict[str, tuple[Callable[[], Awaitable], tuple]] = {}
+        self.tasks: dict[str, asyncio.Task] = {}
+        self.durations: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+        self.failures: dict[str, int] = {}
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self.started_at = None
+        self.ready_at = None
+        self._retry_at: dict[str, float] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._stopped = False
+
+    def step(self, name: str, depends: tuple = ()):
+        def register(fn):
+            self.steps[name] = (fn, depends)
+            return fn
+
+        return register
+
+    def start(self):
+        self._stopped = False
+        self.started_at = time.perf_counter()
+        for name in self.steps:
+            self._task(name)
+
+    async def wait(self, name: str):
+        if name in self.tasks:
+            await asyncio.shield(self._task(name))
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.tasks) and all(
+            task.done() and not task.cancelled() and task.exception() is None
+            for task in self.tasks.values()
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "secondsToReady": (
+                self.ready_at - self.started_at if self.ready_at is not None else None
+            ),
+            "steps": {
+                name: {
+                    "done": name in self.durations,
+                    "seconds": self.durations.get(name),
+                    "error": self.errors.get(name),
+                    "failures": self.failures.get(name, 0),
+                }
+                for name in self.steps
+            },
+        }
+
+    async def stop(self):
+        self._stopped = True
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+    def _task(self, name: str) -> asyncio.Task:
+        """The step's current task, restarted if it failed and its backoff is over."""
+        task = self.tasks.get(name)
+        if task is None or (
+            task.done()
+            and not self._stopped
+            and (task.cancelled() or task.exception() is not None)
+            and time.monotonic() >= self._retry_at.get(name, 0.0)
+        ):
+            task = self.tasks[name] = asyncio.create_task(self._run(name))
+            # Failures are recorded in `errors`; don't also log them as unretrieved.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _run(self, name: str):
+        fn, depends = self.steps[name]
+        try:
+            for dependency in depends:
+                try:
+                    await self.wait(dependency)
+                except Exception as e:
+                    raise RuntimeError(f"dependency {dependency!r} failed: {e!r}") from e
+            started = time.perf_counter()
+            await fn()
+        except Exception as e:
+            self._failed(name, e)
+            raise
+        self.durations[name] = time.perf_counter() - started
+        self.errors.pop(name, None)
+        self.failures.pop(name, None)
+        if self.ready_at is None and len(self.durations) == len(self.steps):
+            self.ready_at = time.perf_counter()
+
+    def _failed(self, name: str, error: Exception):
+        self.errors[name] = repr(error)
+        self.failures[name] = self.failures.get(name, 0) + 1
+        delay = min(self.retry_initial * 2 ** (self.failures[name] - 1), self.retry_max)
+        self._retry_at[name] = time.monotonic() + delay
+        if not self._stopped:
+            timer = self._timers.pop(name, None)
+            if timer is not None:
+                timer.cancel()
+            self._timers[name] = asyncio.get_running_loop().call_later(
+                delay, self._retry, name
+            )
+
+    def _retry(self, name: str):
+        self._timers.pop(name, None)
+        self._task(name)
+
+
+startup = Startup()
@@ -0,0 +1,69 @@
+"""Per-user trip totals kept in step with History inserts.
+
+`record_trips` must run in the same session as the History insert so both
+commit or roll back together. `backfill` rebuilds every row from History;
+run it once after deploying the table: `python -m core.stats` from `src/`.
+"""
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+
+from core.models import History, UserStats
+
+
+STAT_COLUMNS = ("total_distance", "total_fuel", "total_fuel_cost", "total_toll_cost", "trip_count")
+
+
+def record_trips(session: Session, histories: list[History]):
+    totals = {}
+    for history in histories:
+        row = totals.setdefault(history.user_id, dict.fromkeys(STAT_COLUMNS, 0))
+        row["total_distance"] += history.distance
+        row["total_fuel"] += history.fuel_needed
+        row["total_fuel_cost"] += history.fuel_cost
+        row["total_toll_cost"] += history.toll_cost
+        row["trip_count"] += 1
+    if not totals:
+        return
+
+    statement = insert(UserStats).values(
+        [{"user_id": user_id, **row} for user_id, row in totals.items()]
+    )
+    table = UserStats.__table__
+    session.exec(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={
+                column: table.c[column] + statement.excluded[column]
+                for column in STAT_COLUMNS
+            },
+        )
+    )
+
+
+def backfill(session: Session):
+    # Block History inserts for the duration so no trip is counted twice or missed.
+    session.exec(text("LOCK TABLE history IN SHARE MODE"))
+    totals = select(
+        History.user_id,
+        func.sum(History.distance),
+        func.sum(History.fuel_needed),
+        func.sum(History.fuel_cost),
+        func.sum(History.toll_cost),
+        func.count(History.id),
+    ).group_by(History.user_id)
+    statement = insert(UserStats).from_select(["user_id", *STAT_COLUMNS], totals)
+    session.exec(
+        statement.on_conflict_do_update(
+            index_elements=[UserStats.__table__.c.user_id],
+            set_={column: statement.excluded[column] for column in STAT_COLUMNS},
+        )
+    )
+    session.commit()
+
+
+if __name__ == "__main__":
+    from core.db import db_engine
+
+    with Session(db_engine) as session:
+        backfill(session)
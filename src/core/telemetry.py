@@ -0,0 +1,239 @@
+import contextvars
+import re
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from core.metrics import Histogram
+
+
+COMPONENTS = ("db", "model", "maps", "auth")
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class RequestTimings:
+    """Time spent per component, and DB queries issued, by one request.
+
+    Concurrent work inside a request (e.g. gathered Maps calls) is summed,
+    so components can add up to more than the wall-clock latency.
+    """
+
+    __slots__ = ("ms", "queries")
+
+    def __init__(self):
+        self.ms = dict.fromkeys(COMPONENTS, 0.0)
+        self.queries = 0
+
+
+current_request: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "current_request", default=None
+)
+
+
+@contextmanager
+def timed(component: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current_request.get()
+        if timings is not None:
+            timings.ms[component] += (time.perf_counter() - started) * 1000
+
+
+def record_query(elapsed_ms: float):
+    timings = current_request.get()
+    if timings is not None:
+        timings.ms["db"] += elapsed_ms
+        timings.queries += 1
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency_ms = Histogram()
+        self.component_ms = {component: Histogram() for component in COMPONENTS}
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.statuses: dict[int, int] = {}
+
+
+class HttpMetrics:
+    def __init__(self):
+        self.in_flight = 0
+        self.routes: dict[tuple, RouteMetrics] = {}
+
+    def record(
+        self, method: str, route: str, status: int, elapsed_ms: float, timings: RequestTimings
+    ):
+        metrics = self.routes.get((method, route))
+        if metrics is None:
+            metrics = self.routes[(method, route)] = RouteMetrics()
+        metrics.latency_ms.observe(elapsed_ms)
+        for component, ms in timings.ms.items():
+            metrics.component_ms[component].observe(ms)
+        metrics.queries.observe(timings.queries)
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def write(self, out: "PrometheusText"):
+        out.sample("http_requests_in_flight", "gauge", self.in_flight, help="Requests being served")
+        for (method, route), metrics in self.routes.items():
+            labels = {"method": method, "route": route}
+            for status, count in metrics.statuses.items():
+                out.sample(
+                    "http_requests_total",
+                    "counter",
+                    count,
+                    {**labels, "status": str(status)},
+                    help="Requests served",
+                )
+            out.histogram(
+                "http_request_duration_seconds",
+                metrics.latency_ms,
+                labels,
+                scale=0.001,
+                help="Request latency",
+            )
+            for component, histogram in metrics.component_ms.items():
+                out.histogram(
+                    "http_request_component_seconds",
+                    histogram,
+                    {**labels, "component": component},
+                    scale=0.001,
+                    help="Time spent per request in db, model, maps or auth",
+                )
+            out.histogram(
+                "http_request_db_queries", metrics.queries, labels, help="DB queries per request"
+            )
+
+
+http_metrics = HttpMetrics()
+
+
+class TelemetryMiddleware:
+    """ASGI middleware that times each request and its components.
+
+    It installs a RequestTimings for the request that `timed` and the DB
+    cursor hooks add to, then records everything under the matched route's
+    path template so label cardinality stays bounded. The bookkeeping is a
+    few counter updates per request, cheap enough to leave on.
+    """
+
+    def __init__(self, app, metrics: HttpMetrics = http_metrics):
+        self.app = app
+        self.metrics = metrics
+        self._paths: dict = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_request.set(timings)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.metrics.in_flight -= 1
+            current_request.reset(token)
+            self.metrics.record(scope["method"], self._route(scope), status, elapsed_ms, timings)
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._paths.get(endpoint)
+        if path is None:
+            path = next(
+                (
+                    route.path
+                    for route in scope["app"].routes
+                    if getattr(route, "endpoint", None) is endpoint
+                ),
+                "unmatched",
+            )
+            self._paths[endpoint] = path
+        return path
+
+
+def metric_name(key: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", key).lower()
+
+
+class PrometheusText:
+    """Collects samples and renders them in the Prometheus text format."""
+
+    def __init__(self, prefix: str = "lutfuel_"):
+        self.prefix = prefix
+        self.families: dict[str, tuple] = {}
+
+    def sample(
+        self,
+        name: str,
+        kind: str,
+        value: float,
+        labels: Optional[dict] = None,
+        help: str = "",
+    ):
+        name = self.prefix + name
+        family = self.families.setdefault(name, (kind, help, []))
+        family[2].append(f"{name}{self._labels(labels)} {float(value)!r}")
+
+    def histogram(
+        self,
+        name: str,
+        histogram: Histogram,
+        labels: Optional[dict] = None,
+        scale: float = 1.0,
+        help: str = "",
+    ):
+        name = self.prefix + name
+        lines = self.families.setdefault(name, ("histogram", help, []))[2]
+        cumulative = 0
+        for bound, count in zip((*histogram.buckets, float("inf")), histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(float(bound * scale))
+            bucket_labels = self._labels({**(labels or {}), "le": le})
+            lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{name}_sum{self._labels(labels)} {float(histogram.sum * scale)!r}")
+        lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+
+    def snapshot(self, name: str, values: dict, labels: Optional[dict] = None):
+        """Every numeric leaf of a JSON metrics snapshot, as untyped samples."""
+        for key, value in values.items():
+            key = f"{name}_{metric_name(key)}"
+            if isinstance(value, dict):
+                self.snapshot(key, value, labels)
+            elif isinstance(value, (int, float)):
+                self.sample(key, "untyped", value, labels)
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help, samples) in self.families.items():
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(labels: Optional[dict]) -> str:
+        if not labels:
+            return ""
+        pairs = ",".join(
+            f'{key}="{escape_label(str(value))}"' for key, value in labels.items()
+        )
+        return "{" + pairs + "}"
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
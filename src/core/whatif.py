@@ -0,0 +1,65 @@
+from typing import Optional
+
+import numpy as np
+
+from core.features import feature_matrix
+
+
+SORT_KEYS = ("cost", "fuel")
+
+
+def car_mask(
+    cars,
+    maker: Optional[str] = None,
+    year: Optional[int] = None,
+    type_of_car: Optional[int] = None,
+) -> np.ndarray:
+    mask = np.ones(len(cars), dtype=bool)
+    if maker:
+        mask &= np.array([car.maker.lower() == maker.strip().lower() for car in cars], dtype=bool)
+    if year is not None:
+        mask &= np.array([car.year for car in cars], dtype=np.int64) == year
+    if type_of_car is not None:
+        mask &= np.array([car.type_of_car for car in cars], dtype=np.int64) == type_of_car
+    return mask
+
+
+def km_per_liter_matrix(efficiency, predictor, cars: list, grades: list) -> np.ndarray:
+    """km/l for every cars x grades pair.
+
+    Values come from the efficiency table; cars it does not cover yet are
+    predicted together in one forward pass over their feature rows.
+    """
+    values = efficiency.matrix([car.id for car in cars], grades)
+    missing = np.flatnonzero(np.isnan(values).any(axis=1))
+    if len(missing):
+        predicted = predictor.forward(
+            feature_matrix([cars[i] for i in missing], grades)
+        ).reshape(len(missing), len(grades))
+        values[missing] = np.where(np.isnan(values[missing]), predicted, values[missing])
+    return values
+
+
+def rank_costs(
+    km_per_liter: np.ndarray,
+    fuel_columns: np.ndarray,
+    fuel_prices: np.ndarray,
+    distance: float,
+    top_k: int,
+    sort_by: str = "cost",
+) -> tuple:
+    """The `top_k` cheapest (car, fuel) pairs for a trip of `distance` km.
+
+    `fuel_columns[j]` is fuel j's column in `km_per_liter`. Returns car
+    indexes, fuel indexes, fuel needed and fuel cost, ascending by `sort_by`.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fuel_needed = distance / km_per_liter[:, fuel_columns]
+    cost = fuel_needed * fuel_prices
+    key = (cost if sort_by == "cost" else fuel_needed).ravel()
+    valid = np.flatnonzero(np.isfinite(key) & (key >= 0))
+    if top_k < len(valid):
+        valid = valid[np.argpartition(key[valid], top_k)[:top_k]]
+    order = valid[np.argsort(key[valid], kind="stable")]
+    car_rows, fuel_rows = np.unravel_index(order, fuel_needed.shape)
+    return car_rows, fuel_rows, fuel_needed.ravel()[order], cost.ravel()[order]
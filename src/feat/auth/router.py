@@ -1,14 +1,13 @@
 from fastapi import Header, HTTPException
 from typing import Annotated
-from firebase_admin import auth
 
 
 from typing import Union
 from fastapi import Header, HTTPException
 from typing import Union
-from firebase_admin import auth
+from feat.auth.verifier import token_verifier
 
-def get_user_id(
+async def get_user_id(
     authorization: Union[str, None] = Header(None),
     bypasstoken: Union[str, None] = Header(None),
 ) -> str:
@@ -19,7 +18,6 @@ def get_user_id(
 
     token = authorization.split(" ")[1]
     try:
-        decoded_token = auth.verify_id_token(token)
-        return decoded_token["uid"]  # Extract and return only the user ID
+        return await token_verifier.verify(token)
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
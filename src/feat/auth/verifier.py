@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import firebase_admin
+import httpx
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
+
+from core.startup import startup
+from core.telemetry import timed
+
+
+FIREBASE_CERTS_URL = os.getenv(
+    "FIREBASE_CERTS_URL",
+    "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com",
+)
+
+
+class CertificateStore:
+    """Google's ID-token signing keys, refreshed ahead of their expiry.
+
+    `start` launches a background task that re-fetches the certificates
+    `refresh_margin` seconds before the Cache-Control max-age runs out, so
+    requests never wait on the fetch once the first one has completed.
+    """
+
+    def __init__(self, url: str = FIREBASE_CERTS_URL, refresh_margin: float = 300):
+        self.url = url
+        self.refresh_margin = refresh_margin
+        self.keys: dict = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, kid: str):
+        if self._stale(kid):
+            async with self._lock:
+                if self._stale(kid):
+                    await self._fetch()
+        return self.keys.get(kid)
+
+    async def refresh(self):
+        async with self._lock:
+            await self._fetch()
+
+    def _stale(self, kid: str) -> bool:
+        # An unknown kid usually means Google rotated keys before our copy
+        # expired; re-fetch for it at most once a minute so forged kids
+        # cannot turn every request into a certificate download.
+        now = time.time()
+        if now >= self.expires_at:
+            return True
+        return kid not in self.keys and now - self.fetched_at > 60
+
+    async def _fetch(self):
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.get(self.url)
+        response.raise_for_status()
+        self.keys = {
+            kid: load_pem_x509_certificate(pem.encode()).public_key()
+            for kid, pem in response.json().items()
+        }
+        max_age = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+        self.fetched_at = time.time()
+        self.expires_at = self.fetched_at + (int(max_age.group(1)) if max_age else 3600)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            if self.expires_at - time.time() - self.refresh_margin <= 0:
+                try:
+                    await self.refresh()
+                except (httpx.HTTPError, ValueError):
+                    await asyncio.sleep(30)
+                    continue
+            # A max-age within the margin would otherwise re-fetch in a tight loop.
+            await asyncio.sleep(max(self.expires_at - time.time() - self.refresh_margin, 60))
+
+
+class TokenCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: bytes) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.time():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: bytes, expires_at: float, uid: str):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (expires_at, uid)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class FirebaseTokenVerifier:
+    """Verifies Firebase ID tokens and remembers the result until `exp`.
+
+    Cache keys are SHA-256 digests so raw tokens are never held in memory
+    longer than the request. Signature checks on misses run in a worker
+    thread to keep the event loop free.
+    """
+
+    def __init__(
+        self,
+        certs: CertificateStore,
+        cache: TokenCache,
+        project_id: Optional[str] = os.getenv("FIREBASE_PROJECT_ID"),
+    ):
+        self.certs = certs
+        self.cache = cache
+        self._project_id = project_id
+
+    @property
+    def project_id(self) -> str:
+        if self._project_id is None:
+            self._project_id = firebase_admin.get_app().project_id
+        return self._project_id
+
+    async def verify(self, token: str) -> str:
+        with timed("auth"):
+            return await self._verify(token)
+
+    async def _verify(self, token: str) -> str:
+        key = hashlib.sha256(token.encode()).digest()
+        uid = self.cache.get(key)
+        if uid is not None:
+            return uid
+
+        await startup.wait("firebase")
+        kid = jwt.get_unverified_header(token).get("kid")
+        public_key = await self.certs.get(kid)
+        if public_key is None:
+            raise jwt.InvalidTokenError("ID token has an unknown key id")
+        claims = await asyncio.to_thread(
+            jwt.decode,
+            token,
+            public_key,
+            algorithms=["RS256"],
+            audience=self.project_id,
+            issuer=f"https://securetoken.google.com/{self.project_id}",
+            options={"require": ["exp", "iat", "sub"]},
+        )
+        if not claims["sub"]:
+            raise jwt.InvalidTokenError("ID token has an empty subject")
+        self.cache.set(key, claims["exp"], claims["sub"])
+        return claims["sub"]
+
+
+token_verifier = FirebaseTokenVerifier(
+    CertificateStore(),
+    TokenCache(int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))),
+)
@@ -1,26 +1,145 @@
-import requests
+import asyncio
+import os
+import re
+from typing import Optional
+
+import httpx
+from core.cache import MISSING, create_cache
+from core.distance import DistanceEstimator, RoadGraph, haversine_km
+from core.geocode import ReverseGeocoder
 from core.keys.secrets import GOOGLE_MAPS_API_KEY
+from core.telemetry import timed
 from pydantic import BaseModel
 
 
-def request_direction(
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_API_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+NO_ROUTE_STATUSES = {"ZERO_RESULTS", "NOT_FOUND"}
+PLACE_OK_STATUSES = {"OK", "ZERO_RESULTS"}
+
+
+class MapsError(Exception):
+    """Google answered with a non-OK status, e.g. ZERO_RESULTS or REQUEST_DENIED."""
+
+    def __init__(self, status: str):
+        super().__init__(f"Google Maps returned {status}")
+        self.status = status
+
+
+class MapsClient:
+    """Shared async client for the Google Maps web services.
+
+    One keep-alive connection pool is reused across requests, at most
+    `max_concurrency` calls are in flight at once, and throttled or failed
+    calls are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        base_url: str = os.getenv(
+            "GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com/maps/api"
+        ),
+        api_key: str = GOOGLE_MAPS_API_KEY,
+        timeout: float = float(os.getenv("GOOGLE_MAPS_TIMEOUT", "10")),
+        max_concurrency: int = int(os.getenv("GOOGLE_MAPS_MAX_CONCURRENCY", "20")),
+        retries: int = int(os.getenv("GOOGLE_MAPS_RETRIES", "2")),
+        backoff: float = 0.2,
+    ):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+        return self._client
+
+    async def get(self, path: str, params: dict) -> dict:
+        params = {**params, "key": self.api_key}
+        with timed("maps"):
+            return await self._get(path, params)
+
+    async def _get(self, path: str, params: dict) -> dict:
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                last_attempt = attempt == self.retries
+                try:
+                    response = await self.client.get(path, params=params)
+                    if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                        response.raise_for_status()
+                        body = response.json()
+                        if body.get("status") not in RETRY_API_STATUSES or last_attempt:
+                            return body
+                except httpx.TransportError:
+                    if last_attempt:
+                        raise
+                await asyncio.sleep(self.backoff * 2**attempt)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+maps = MapsClient()
+
+ROUTE_CACHE_PRECISION = int(os.getenv("ROUTE_CACHE_PRECISION", "3"))
+route_cache = create_cache(
+    "routes",
+    max_size=int(os.getenv("ROUTE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("ROUTE_CACHE_TTL", "86400")),
+    redis_url=os.getenv("CACHE_REDIS_URL"),
+)
+distance_estimator = DistanceEstimator(
+    capacity=int(os.getenv("DISTANCE_ESTIMATOR_SAMPLES", "50000")),
+)
+
+
+def load_road_graph():
+    if os.getenv("ROAD_GRAPH_PATH"):
+        distance_estimator.graph = RoadGraph.load(
+            os.environ["ROAD_GRAPH_PATH"],
+            max_snap_km=float(os.getenv("ROAD_GRAPH_MAX_SNAP_KM", "1")),
+            max_expansions=int(os.getenv("ROAD_GRAPH_MAX_EXPANSIONS", "20000")),
+        )
+
+
+async def request_direction(
     lat1: float, lng1: float, lat2: float, lng2: float, avoid_tolls: bool
 ):
-    response = requests.get(
-        "https://maps.googleapis.com/maps/api/directions/json",
-        params={
+    return await maps.get(
+        "/directions/json",
+        {
             "origin": f"{lat1},{lng1}",
             "destination": f"{lat2},{lng2}",
             "mode": "driving",
             "avoid": "tolls" if avoid_tolls else "",
             "extraComputations": ["TOLLS"],
-            "routeModifiers": {
-                "vehicleInfo": {"emissionType": "GASOLINE"},
-            },
-            "key": GOOGLE_MAPS_API_KEY,
         },
-    ).json()
-    return response
+    )
+
+
+TOLL_STEP = re.compile(r"\btoll?\b", re.IGNORECASE)
+
+
+class RouteStep(BaseModel):
+    polyline: str
+    distance: float  # m
+    duration: float  # s
+    toll: bool = False
 
 
 class RouteResult(BaseModel):
@@ -30,12 +149,64 @@ class RouteResult(BaseModel):
     duration: int  # minutes
     polyline: list[str]
     cost: int = 0  # IDR
+    # Per-step detail for fuel profiles; not part of the /routes response.
+    steps: list[RouteStep] = []
 
 
-def get_routes(lat1: float, lng1: float, lat2: float, lng2: float) -> list[RouteResult]:
-    tolls_route = request_direction(lat1, lng1, lat2, lng2, False)
-    no_tolls_route = request_direction(lat1, lng1, lat2, lng2, True)
-    print(tolls_route)
+def route_steps(leg: dict) -> list[RouteStep]:
+    # Indonesian toll roads are named "Jalan Tol ..."; Google also says "Toll road".
+    return [
+        RouteStep(
+            polyline=step["polyline"]["points"],
+            distance=step["distance"]["value"],
+            duration=step["duration"]["value"],
+            toll=bool(TOLL_STEP.search(step.get("html_instructions", ""))),
+        )
+        for step in leg.get("steps", [])
+    ]
+
+
+async def get_routes(
+    lat1: float, lng1: float, lat2: float, lng2: float
+) -> list[RouteResult]:
+    # Snap to the cache grid (3 decimals is ~110 m) and request the snapped
+    # points, so a cached entry is exactly what any caller in that cell gets.
+    lat1, lng1, lat2, lng2 = (
+        round(value, ROUTE_CACHE_PRECISION) for value in (lat1, lng1, lat2, lng2)
+    )
+    key = f"{lat1},{lng1}:{lat2},{lng2}"
+    cached = await route_cache.get(key)
+    if cached is not MISSING:
+        return [RouteResult(**route) for route in cached]
+
+    try:
+        routes = await fetch_routes(lat1, lng1, lat2, lng2)
+    except (httpx.TransportError, httpx.HTTPStatusError) as e:
+        if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+            raise
+        # Google is unreachable or failing: answer from the local estimate
+        # instead, and leave it out of the cache.
+        return [await asyncio.to_thread(estimate_route, lat1, lng1, lat2, lng2)]
+    await route_cache.set(key, [route.dict() for route in routes])
+    return routes
+
+
+async def fetch_routes(
+    lat1: float, lng1: float, lat2: float, lng2: float
+) -> list[RouteResult]:
+    tolls_route, no_tolls_route = await asyncio.gather(
+        request_direction(lat1, lng1, lat2, lng2, False),
+        request_direction(lat1, lng1, lat2, lng2, True),
+    )
+    for response in (tolls_route, no_tolls_route):
+        if response.get("status") != "OK":
+            raise MapsError(response.get("status"))
+    straight_km = haversine_km(lat1, lng1, lat2, lng2)
+    for response in (tolls_route, no_tolls_route):
+        leg = response["routes"][0]["legs"][0]
+        distance_estimator.observe(
+            straight_km, leg["distance"]["value"] / 1000, leg["duration"]["value"] / 60
+        )
     return [
         RouteResult(
             id=0,
@@ -43,6 +214,7 @@ def get_routes(lat1: float, lng1: float, lat2: float, lng2: float) -> list[Route
             distance=tolls_route["routes"][0]["legs"][0]["distance"]["value"] // 1000,
             duration=tolls_route["routes"][0]["legs"][0]["duration"]["value"] // 60,
             polyline=[tolls_route["routes"][0]["overview_polyline"]["points"]],
+            steps=route_steps(tolls_route["routes"][0]["legs"][0]),
             # cost=tolls_route["routes"][0]["legs"][0]["travelAdvisory"]["tollInfo"]["estimatedPrice"][0]["nanos"],
         ),
         RouteResult(
@@ -52,10 +224,22 @@ def get_routes(lat1: float, lng1: float, lat2: float, lng2: float) -> list[Route
             // 1000,
             duration=no_tolls_route["routes"][0]["legs"][0]["duration"]["value"] // 60,
             polyline=[no_tolls_route["routes"][0]["overview_polyline"]["points"]],
+            steps=route_steps(no_tolls_route["routes"][0]["legs"][0]),
         ),
     ]
 
 
+def estimate_route(lat1: float, lng1: float, lat2: float, lng2: float) -> RouteResult:
+    estimate = distance_estimator.estimate(lat1, lng1, lat2, lng2)
+    return RouteResult(
+        id=1,
+        name="Estimated",
+        distance=round(estimate["distance"], 1),
+        duration=round(estimate["duration"]),
+        polyline=[],
+    )
+
+
 class SearchLocationResult(BaseModel):
     name: str
     address: str
@@ -63,37 +247,163 @@ class SearchLocationResult(BaseModel):
     longitude: float
 
 
-def search_location(query: str) -> list[SearchLocationResult]:
-    response = requests.get(
-        "https://maps.googleapis.com/maps/api/place/textsearch/json",
-        params={
-            "query": query,
-            "key": GOOGLE_MAPS_API_KEY,
-        },
-    ).json()
-    return [
-        SearchLocationResult(
-            name=result["name"],
-            address=result["formatted_address"],
-            latitude=result["geometry"]["location"]["lat"],
-            longitude=result["geometry"]["location"]["lng"],
+# Text Search returns at most this many results per page; a shorter list is
+# everything Google matched for that query.
+PLACE_PAGE_SIZE = 20
+PLACE_MIN_PREFIX = 3
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class PlaceSearch:
+    """Text Search with a result cache, prefix reuse and request merging.
+
+    A refinement of a cached query (e.g. "jakarta sel" after "jakarta") is
+    answered by filtering the cached results when that cached list was
+    complete and the filter still matches something. Identical queries that
+    arrive while one is in flight share the same upstream call.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.upstream_calls = 0
+        self.prefix_hits = 0
+        self.coalesced = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def search(self, query: str) -> list[dict]:
+        key = normalize_query(query)
+        cached = await self.cache.get(key)
+        if cached is not MISSING:
+            return cached
+
+        refined = self._from_prefix(key)
+        if refined is not None:
+            self.prefix_hits += 1
+            return refined
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._fetch(key))
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self._inflight[key] = inflight
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(inflight)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.cache.stats.snapshot(),
+            "prefixHits": self.prefix_hits,
+            "coalesced": self.coalesced,
+            "upstreamCalls": self.upstream_calls,
+        }
+
+    def _from_prefix(self, key: str) -> Optional[list[dict]]:
+        tokens = key.split()
+        for end in range(len(key) - 1, PLACE_MIN_PREFIX - 1, -1):
+            results = self.cache.get_local(key[:end])
+            if results is MISSING or len(results) >= PLACE_PAGE_SIZE:
+                continue
+            matches = [
+                result
+                for result in results
+                if all(
+                    token in f"{result['name']} {result['address']}".lower()
+                    for token in tokens
+                )
+            ]
+            return matches or None
+        return None
+
+    async def _fetch(self, key: str) -> list[dict]:
+        self.upstream_calls += 1
+        response = await maps.get("/place/textsearch/json", {"query": key})
+        # Denied or throttled searches also come back with no results; only
+        # a real answer may be cached.
+        if response.get("status") not in PLACE_OK_STATUSES:
+            raise MapsError(response.get("status"))
+        results = [
+            {
+                "name": result["name"],
+                "address": result["formatted_address"],
+                "latitude": result["geometry"]["location"]["lat"],
+                "longitude": result["geometry"]["location"]["lng"],
+            }
+            for result in response.get("results", [])
+        ]
+        await self.cache.set(key, results)
+        return results
+
+
+place_search = PlaceSearch(
+    create_cache(
+        "places",
+        max_size=int(os.getenv("PLACE_CACHE_SIZE", "5000")),
+        ttl=float(os.getenv("PLACE_CACHE_TTL", "3600")),
+        redis_url=os.getenv("CACHE_REDIS_URL"),
+    )
+)
+
+
+async def search_location(query: str) -> list[SearchLocationResult]:
+    return [SearchLocationResult(**result) for result in await place_search.search(query)]
+
+
+async def getLocationName(lat: float, lng: float) -> Optional[dict]:
+    response = await maps.get("/geocode/json", {"latlng": f"{lat},{lng}"})
+    results = response.get("results") or []
+    return results[0] if results else None
+
+
+class GeocodeStats:
+    def __init__(self):
+        self.local_hits = 0
+        self.remote_calls = 0
+        self.fallbacks = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "localHits": self.local_hits,
+            "remoteCalls": self.remote_calls,
+            "fallbacks": self.fallbacks,
+        }
+
+
+local_geocoder: Optional[ReverseGeocoder] = None
+geocode_stats = GeocodeStats()
+
+
+def load_local_geocoder():
+    global local_geocoder
+    if os.getenv("PLACES_DATASET"):
+        local_geocoder = ReverseGeocoder.load(
+            os.environ["PLACES_DATASET"],
+            max_distance_km=float(os.getenv("PLACES_MAX_DISTANCE_KM", "2")),
         )
-        for result in response["results"]
-    ]
 
 
-def getLocationName(lat: float, lng: float) -> str:
-    response = requests.get(
-        "https://maps.googleapis.com/maps/api/geocode/json",
-        params={
-            "latlng": f"{lat},{lng}",
-            "key": GOOGLE_MAPS_API_KEY,
-        },
-    ).json()
-    return response["results"][0]
+async def reverse_geocode(lat: float, lng: float) -> str:
+    """Place name for a point, or "lat,lng" when Google has none or fails."""
+    if local_geocoder is not None:
+        name = local_geocoder.nearest(lat, lng)
+        if name is not None:
+            geocode_stats.local_hits += 1
+            return name
+    geocode_stats.remote_calls += 1
+    try:
+        location = await getLocationName(lat, lng)
+    except httpx.HTTPError:
+        location = None
+    if location is None:
+        geocode_stats.fallbacks += 1
+        return f"{lat},{lng}"
+    return location["formatted_address"]
 
 
 if __name__ == "__main__":
     # print(get_routes(-6.184610, 106.889003, -6.280051, 106.826409))
     # print(search_location("fasilkom"))
-    print(getLocationName(-6.184610, 106.889003))
+    print(asyncio.run(getLocationName(-6.184610, 106.889003)))
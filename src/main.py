@@ -1,11 +1,3 @@
-import uvicorn
-from fastapi import FastAPI
-from pydantic import BaseModel
-from sqlmodel import Field, SQLModel, create_engine, Session
-from typing import Optional
-from core.keys.keys import DATABASE_URL
-
-
 # model = tf.keras.models.load_model('model.h5')
 # scaler = joblib.load('scaler.joblib')
 
@@ -28,8 +20,7 @@ from core.keys.keys import DATABASE_URL
 #     type_of_car: int
 #     car_name: str
 
-engine = create_engine(DATABASE_URL)
-SQLModel.metadata.create_all(engine)
+# Tables and indexes are created by `python migrate.py`.
 
 # class UserInput(BaseModel):
 #     Number_of_Cylinders: int
@@ -0,0 +1,37 @@
+"""Create missing tables and apply the schema changes create_all cannot make.
+
+Run from `src/` before deploying: `python migrate.py`
+Every statement is idempotent, so it is safe to run on every deploy.
+"""
+from sqlalchemy import text
+from sqlmodel import SQLModel
+
+from core.db import db_engine
+import core.models  # noqa: F401 registers the tables on SQLModel.metadata
+
+
+MIGRATIONS = [
+    # user_id used to be matched with ILIKE '%uid%', which also hid stray
+    # whitespace around stored ids; exact matching needs them trimmed.
+    "UPDATE history SET user_id = btrim(user_id) WHERE user_id <> btrim(user_id)",
+    "UPDATE carownership SET user_id = btrim(user_id) WHERE user_id <> btrim(user_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_history_user_id_id ON history (user_id, id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_carownership_user_id_id ON carownership (user_id, id)",
+    # Trip endpoints, so the distance estimator can learn from past trips.
+    "ALTER TABLE history ADD COLUMN IF NOT EXISTS from_lat double precision",
+    "ALTER TABLE history ADD COLUMN IF NOT EXISTS from_lng double precision",
+    "ALTER TABLE history ADD COLUMN IF NOT EXISTS destination_lat double precision",
+    "ALTER TABLE history ADD COLUMN IF NOT EXISTS destination_lng double precision",
+]
+
+
+def migrate(engine=db_engine):
+    SQLModel.metadata.create_all(engine)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in MIGRATIONS:
+            print(statement)
+            conn.execute(text(statement))
+
+
+if __name__ == "__main__":
+    migrate()
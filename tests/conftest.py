@@ -0,0 +1,50 @@
+"""Shared test setup.
+
+`core.keys.secrets` holds deployment credentials and is not in the
+repository, so the tests install their own values before anything imports
+it. Tests that need PostgreSQL use the `database` fixture, which skips them
+unless TEST_DATABASE_URL points at a scratch database.
+"""
+import os
+import sys
+import types
+
+import pytest
+
+
+# Shared caches would answer repeat requests without reaching the code under test.
+os.environ.pop("CACHE_REDIS_URL", None)
+
+secrets = types.ModuleType("core.keys.secrets")
+secrets.DATABASE_URL = os.getenv("TEST_DATABASE_URL", "postgresql://localhost/lutfuel_test")
+secrets.GOOGLE_MAPS_API_KEY = "test-key"
+keys = types.ModuleType("core.keys")
+keys.__path__ = []
+keys.secrets = secrets
+sys.modules["core.keys"] = keys
+sys.modules["core.keys.secrets"] = secrets
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def database():
+    if not os.getenv("TEST_DATABASE_URL"):
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from sqlalchemy import text
+
+    from core.db import db_engine
+    from migrate import migrate
+
+    migrate(db_engine)
+    yield db_engine
+    with db_engine.begin() as conn:
+        conn.execute(
+            text(
+                "TRUNCATE history, carownership, userstats, carefficiency, car, spbu_data "
+                "RESTART IDENTITY CASCADE"
+            )
+        )
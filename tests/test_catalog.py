@@ -0,0 +1,154 @@
+"""Catalog reload rules: version changes, the TTL, and the check interval."""
+import types
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+import core.catalog
+from core.catalog import Catalog
+from core.models import Car, SPBU_Data
+
+
+CHECK_INTERVAL = 30.0
+TTL = 3600.0
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(core.catalog, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def engine(database):
+    with Session(database) as session:
+        session.add(
+            Car(
+                maker="Toyota",
+                model="Avanza",
+                number_of_cylinders=4,
+                engine_type=1300,
+                engine_horse_power=95.0,
+                engine_horse_power_rpm=6000,
+                transmission=1,
+                fuel_tank_capacity=45,
+                acceleration_0_to_100_km=12.5,
+                max_speed_km_per_hour=165,
+                fuel_grade=90,
+                year=2019,
+                type_of_car=1,
+                car_name="Avanza",
+            )
+        )
+        session.add(
+            SPBU_Data(gas_station="Pertamina", fuel_type="Pertalite", fuel_grade=90, fuel_price=10000)
+        )
+        session.commit()
+    return database
+
+
+@pytest.fixture
+def catalog(engine, clock):
+    catalog = Catalog(check_interval=CHECK_INTERVAL, ttl=TTL)
+    with Session(engine) as session:
+        catalog.refresh(session, force=True)
+    return catalog
+
+
+def update(engine, model, **values):
+    with Session(engine) as session:
+        row = session.exec(select(model)).one()
+        for name, value in values.items():
+            setattr(row, name, value)
+        session.add(row)
+        session.commit()
+        return row.id
+
+
+def refresh(engine, catalog: Catalog) -> int:
+    """Refresh and return how many statements it ran."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with Session(engine) as session:
+            catalog.refresh(session)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return len(statements)
+
+
+@pytest.mark.parametrize(
+    "model, column, value",
+    [
+        (Car, "car_name", "Avanza Veloz"),
+        # Same length, and in columns no sum could see.
+        (Car, "maker", "Daihat"),
+        (Car, "model", "Xenia!"),
+        (SPBU_Data, "gas_station", "Shell"),
+    ],
+)
+def test_version_change_reloads(engine, catalog, clock, model, column, value):
+    generation = catalog.generation
+    row_id = update(engine, model, **{column: value})
+    clock.now += CHECK_INTERVAL
+
+    refresh(engine, catalog)
+
+    assert catalog.generation == generation + 1
+    record = catalog.car(row_id) if model is Car else catalog.fuel(row_id)
+    assert getattr(record, column) == value
+
+
+def test_swapped_values_reload(engine, catalog, clock):
+    generation = catalog.generation
+    # Moves weight between columns while keeping their sum.
+    update(engine, Car, number_of_cylinders=5, transmission=0)
+    clock.now += CHECK_INTERVAL
+
+    refresh(engine, catalog)
+
+    assert catalog.generation == generation + 1
+
+
+def test_unchanged_version_does_not_reload(engine, catalog, clock):
+    generation = catalog.generation
+    clock.now += CHECK_INTERVAL
+
+    assert refresh(engine, catalog) == 2  # the two version queries only
+    assert catalog.generation == generation
+
+
+def test_check_interval_is_respected(engine, catalog, clock):
+    generation = catalog.generation
+    car_id = update(engine, Car, car_name="Avanza Veloz")
+    clock.now += CHECK_INTERVAL - 1
+
+    assert refresh(engine, catalog) == 0
+    assert catalog.generation == generation
+    assert catalog.car(car_id).car_name == "Avanza"
+
+
+def test_ttl_expiry_reloads(engine, catalog, clock):
+    generation = catalog.generation
+
+    clock.now += CHECK_INTERVAL
+    refresh(engine, catalog)
+    assert catalog.generation == generation
+
+    clock.now += TTL
+    refresh(engine, catalog)
+    assert catalog.generation == generation + 1
@@ -0,0 +1,166 @@
+"""MapsClient retries and concurrency, against a local stub of the Maps API."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import get_polyline
+from get_polyline import MapsClient
+
+
+pytestmark = pytest.mark.anyio
+
+RETRIES = 2
+OK = (200, {"status": "OK", "results": []})
+
+
+def directions(distance_m: int = 12_000, duration_s: int = 1_200) -> dict:
+    leg = {
+        "distance": {"value": distance_m},
+        "duration": {"value": duration_s},
+        "steps": [
+            {
+                "polyline": {"points": "_p~iF~ps|U_ulLnnqC"},
+                "distance": {"value": distance_m},
+                "duration": {"value": duration_s},
+                "html_instructions": "Head north",
+            }
+        ],
+    }
+    return {
+        "status": "OK",
+        "routes": [{"legs": [leg], "overview_polyline": {"points": "_p~iF~ps|U_ulLnnqC"}}],
+    }
+
+
+class StubServer(ThreadingHTTPServer):
+    """Answers call n with `script[n]`, repeating the last entry, after `delay` seconds."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.script = [OK]
+        self.delay = 0.0
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def handle_error(self, request, client_address):
+        pass  # clients that timed out hang up mid-response
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            status, body = server.script[min(server.calls, len(server.script) - 1)]
+            server.calls += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+async def client(server):
+    client = MapsClient(
+        base_url=server.url, api_key="test-key", timeout=1.0, retries=RETRIES, backoff=0.01
+    )
+    yield client
+    await client.close()
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+async def test_retries_throttled_and_failed_responses(server, client, status):
+    server.script = [(status, {}), OK]
+
+    assert await client.get("/geocode/json", {}) == OK[1]
+    assert server.calls == 2
+
+
+async def test_retries_over_query_limit(server, client):
+    server.script = [(200, {"status": "OVER_QUERY_LIMIT"}), OK]
+
+    assert await client.get("/geocode/json", {}) == OK[1]
+    assert server.calls == 2
+
+
+async def test_gives_up_after_retries(server, client):
+    server.script = [(503, {})]
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await client.get("/geocode/json", {})
+    assert server.calls == RETRIES + 1
+
+
+async def test_returns_over_query_limit_after_retries(server, client):
+    server.script = [(200, {"status": "OVER_QUERY_LIMIT"})]
+
+    body = await client.get("/geocode/json", {})
+    assert body["status"] == "OVER_QUERY_LIMIT"
+    assert server.calls == RETRIES + 1
+
+
+async def test_does_not_retry_client_errors(server, client):
+    server.script = [(400, {}), OK]
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await client.get("/geocode/json", {})
+    assert server.calls == 1
+
+
+async def test_retries_timeouts(server):
+    server.delay = 0.5
+    client = MapsClient(
+        base_url=server.url, api_key="test-key", timeout=0.1, retries=RETRIES, backoff=0.01
+    )
+    try:
+        with pytest.raises(httpx.TimeoutException):
+            await client.get("/geocode/json", {})
+    finally:
+        await client.close()
+    assert server.calls == RETRIES + 1
+
+
+async def test_direction_calls_run_concurrently(server, client, monkeypatch):
+    server.script = [(200, directions())]
+    server.delay = 0.2
+    monkeypatch.setattr(get_polyline, "maps", client)
+
+    routes = await get_polyline.fetch_routes(-6.1846, 106.889, -6.2801, 106.8264)
+
+    assert [route.name for route in routes] == ["Tolls", "No Tolls"]
+    assert routes[0].distance == 12
+    assert server.calls == 2
+    assert server.max_in_flight == 2
@@ -0,0 +1,38 @@
+"""The NumPy backend must predict what Keras predicts for the shipped model."""
+import itertools
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from core.model import load_model
+
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+MODEL_PATH = str(SRC / "model.h5")
+SCALER_PATH = str(SRC / "scaler.joblib")
+TOLERANCE = 1e-3
+
+GRID = {
+    "number_of_cylinders": [3, 4, 6, 8],
+    "engine_type": [0, 1],
+    "engine_horse_power": [90, 150, 250],
+    "engine_horse_power_rpm": [4500, 5500, 6500],
+    "transmission": [0, 1],
+    "fuel_tank_capacity": [40, 60, 80],
+    "acceleration_0_to_100_km": [7, 10, 13],
+    "fuel_grade": [0, 1, 2, 3, 4],
+}
+
+
+def test_numpy_backend_matches_keras():
+    pytest.importorskip("tensorflow")
+    joblib = pytest.importorskip("joblib")
+
+    scaler = joblib.load(SCALER_PATH)
+    inputs = scaler.transform(np.array(list(itertools.product(*GRID.values()))))
+    keras = load_model(MODEL_PATH, "keras").predict(inputs, verbose=0)
+    numpy = load_model(MODEL_PATH, "numpy").predict(inputs)
+
+    assert keras.shape == numpy.shape
+    assert float(np.max(np.abs(keras - numpy))) <= TOLERANCE